@@ -0,0 +1,108 @@
+"""
+Benchmark HTMLTableConverter.select_tables with streaming against the full parse.
+
+Builds synthetic pages and selects their tables both ways:
+- closed:   selected, nested, unselected and non-matching tables, entities
+            and spans, with every end tag written out
+- unclosed: the same tables without </td>, </th> and </tr>, as HTML allows
+- trailing: one table of 400 rows with unclosed cells followed by a lot of
+            ordinary text, which must not be added to the cells of the table
+
+Both ways must yield the same grids (from _extract_table_data) for every
+page. Wall time and peak traced memory are measured in one run each.
+
+Usage: python benchmarks/bench_html_streaming.py [pages]
+"""
+import os
+import sys
+import time
+import random
+import logging
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, "htmlTable2XLS"))
+
+from htmlTable2XLS import HTMLTableConverter
+
+HEADER = HTMLTableConverter.HEADER_INDICATOR
+
+def make_table(rnd, closed, nested=True):
+    """Return the source of a random table; cells and rows are closed only if closed is set."""
+    td_end, tr_end = ("</td>", "</tr>") if closed else ("", "")
+    header = HEADER if rnd.random() < 0.7 else "Other"
+    lines = ["<table>", f"<tr><th>{header}{'</th>' if closed else ''}<th>B &amp; C{'</th>' if closed else ''}{tr_end}"]
+    for r in range(rnd.randint(1, 8)):
+        cells = []
+        for c in range(rnd.randint(1, 4)):
+            attrs = ""
+            if rnd.random() < 0.2:
+                attrs = f' rowspan="{rnd.randint(1, 3)}" colspan="{rnd.randint(1, 3)}"'
+            content = f"r{r}c{c}"
+            if nested and rnd.random() < 0.05:
+                content += make_table(rnd, closed, nested=False)
+            cells.append(f"<td{attrs}>{content}{td_end}")
+        lines.append("<tr>" + "".join(cells) + tr_end)
+    lines.append("</table>")
+    return "\n".join(lines)
+
+def make_page(rnd, closed):
+    parts = ["<html><body><p>Intro</p>"]
+    for _ in range(rnd.randint(1, 6)):
+        table = make_table(rnd, closed)
+        if rnd.random() < 0.8:
+            parts.append(f'<div class="table-wrap"><div class="table-block">{table}</div></div>')
+        else:
+            parts.append(f"<div>{table}</div>")
+        parts.append("<p>Between &lt;tables&gt;</p>")
+    parts.append("</body></html>")
+    return "".join(parts)
+
+def make_trailing_page():
+    rows = "".join(f"<tr><td>r{i}<td>v{i}" for i in range(400))
+    text = "".join(f"<p>text {i}</p>" for i in range(20000))
+    return f'<div class="table-wrap"><div class="table-block"><table><tr><th>{HEADER}{rows}</table></div></div>{text}'
+
+def grids(converter, html_file):
+    return [converter._extract_table_data(table) for table in converter.select_tables(html_file)]
+
+def measure(streaming, files):
+    """Return (grids per file, seconds, peak traced MiB) of selecting the tables of files."""
+    converter = HTMLTableConverter(streaming=streaming)
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = [grids(converter, html_file) for html_file in files]
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    logging.disable(logging.WARNING)
+    rnd = random.Random(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        scenarios = {"closed": [], "unclosed": [], "trailing": []}
+        for name in ("closed", "unclosed"):
+            for page in range(pages):
+                html_file = Path(tmp, f"{name}{page:04d}.html")
+                html_file.write_text(make_page(rnd, name == "closed"), encoding="utf-8")
+                scenarios[name].append(html_file)
+        html_file = Path(tmp, "trailing.html")
+        html_file.write_text(make_trailing_page(), encoding="utf-8")
+        scenarios["trailing"].append(html_file)
+
+        for name, files in scenarios.items():
+            full, full_time, full_peak = measure(False, files)
+            streamed, streamed_time, streamed_peak = measure(True, files)
+            tables = sum(len(file_grids) for file_grids in full)
+            print(f"{name}: {len(files)} pages, {tables} matching tables")
+            print(f"  full parse {full_time:8.2f}s {full_peak:10.1f} MiB")
+            print(f"  streaming  {streamed_time:8.2f}s {streamed_peak:10.1f} MiB")
+            print(f"  identical output: {full == streamed}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark JsonTranslationHandler.flatten_json against the previous recursive version.
+
+Builds three synthetic bundles and times both flatteners on each:
+- wide:  many top-level sections with many short keys each
+- deep:  many branches nested dozens of levels below the root
+- chain: a single branch nested far past the recursion limit
+
+The previous version copies every leaf once per nesting level and raises
+RecursionError on the chain bundle. Both versions run with lists kept as
+values, so their outputs can be compared.
+
+Usage: python benchmarks/bench_json_flatten.py
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, "json2csv"))
+
+from json2csv import JsonTranslationHandler, TranslationConfig
+
+REPEAT = 3
+
+def legacy_flatten_json(nested_json, parent_key='', separator='.'):
+    """flatten_json as it was before the iterative rewrite."""
+    items = {}
+    for key, value in nested_json.items():
+        new_key = f"{parent_key}{separator}{key}" if parent_key else key
+        if isinstance(value, dict):
+            items.update(legacy_flatten_json(value, new_key, separator))
+        else:
+            items[new_key] = value
+    return items
+
+def make_wide(sections=2_000, keys=500):
+    return {f"section{s}": {f"key{k}": f"Text {s}-{k}" for k in range(keys)} for s in range(sections)}
+
+def make_deep(branches=20_000, depth=40):
+    root = {}
+    for b in range(branches):
+        node = root
+        for level in range(depth):
+            node = node.setdefault(f"b{b % (7 + level)}_{level}", {})
+        node[f"leaf{b}"] = f"Text {b}"
+    return root
+
+def make_chain(depth=100_000):
+    root = node = {}
+    for level in range(depth):
+        node[f"n{level}"] = {}
+        node = node[f"n{level}"]
+    node["leaf"] = "Text"
+    return root
+
+def timed(func, data):
+    """Return (best seconds, result) over REPEAT runs, or (None, error name)."""
+    best = float("inf")
+    result = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        try:
+            result = func(data)
+        except RecursionError as e:
+            return None, type(e).__name__
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    handler = JsonTranslationHandler(TranslationConfig(Path("."), Path("out.csv"), expand_lists=False))
+    bundles = {"wide": make_wide(), "deep": make_deep(), "chain": make_chain()}
+
+    for name, data in bundles.items():
+        legacy_time, legacy_result = timed(legacy_flatten_json, data)
+        current_time, current_result = timed(handler.flatten_json, data)
+        leaves = len(current_result)
+        print(f"{name}: {leaves:,} keys")
+        if legacy_time is None:
+            print(f"  legacy   {legacy_result}")
+        else:
+            print(f"  legacy   {legacy_time:8.3f}s {leaves / legacy_time:14,.0f} keys/s")
+        print(f"  current  {current_time:8.3f}s {leaves / current_time:14,.0f} keys/s")
+        if legacy_time is not None:
+            same = list(legacy_result.items()) == list(current_result.items())
+            print(f"  speedup {legacy_time / current_time:.2f}x, identical output: {same}")
+
+if __name__ == "__main__":
+    main()
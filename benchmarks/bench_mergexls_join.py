@@ -0,0 +1,63 @@
+"""
+Benchmark mergexls.join_frames against the previous pairwise outer merges.
+
+Builds N synthetic three-column frames like the ones read from the Excel
+files (two key columns and one translation column), where every frame misses
+a few keys of the others, and times both ways of joining them for
+N = 10, 100 and 300. Outputs are compared after aligning the column order.
+
+Usage: python benchmarks/bench_mergexls_join.py [rows per file]
+"""
+import os
+import sys
+import time
+import random
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, "mergexls"))
+
+from mergexls import join_frames
+
+FILE_COUNTS = (10, 100, 300)
+
+def legacy_join(dfs):
+    """The merge loop of merge_excel_files before the one-shot join."""
+    merged_df = dfs[0]
+    for df in dfs[1:]:
+        merged_df = pd.merge(merged_df, df, on=df.columns[:2].tolist(), how='outer')
+    return merged_df
+
+def make_frames(files, rows, rnd):
+    keys = [(f"screen{i % 50}.label{i}", f"ラベル{i}") for i in range(rows)]
+    dfs = []
+    for n in range(files):
+        sample = [key for key in keys if rnd.random() > 0.02]
+        dfs.append(pd.DataFrame({
+            "key": [key for key, _ in sample],
+            "ja_JP": [source for _, source in sample],
+            f"lang{n:03d}": [f"text {n} {key}" for key, _ in sample],
+        }))
+    return dfs
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    rnd = random.Random(0)
+
+    for files in FILE_COUNTS:
+        dfs = make_frames(files, rows, rnd)
+        legacy_time, legacy = timed(legacy_join, dfs)
+        current_time, current = timed(join_frames, dfs)
+        same = legacy.reset_index(drop=True).equals(current[legacy.columns].reset_index(drop=True))
+        print(f"{files} files x {rows:,} rows")
+        print(f"  legacy   {legacy_time:8.2f}s")
+        print(f"  current  {current_time:8.2f}s")
+        print(f"  speedup {legacy_time / current_time:.2f}x, identical output: {same}")
+
+if __name__ == "__main__":
+    main()
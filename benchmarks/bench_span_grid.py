@@ -0,0 +1,131 @@
+"""
+Benchmark HTMLTableConverter.iter_table_rows against the previous grid builder.
+
+Builds synthetic tables of 100k rows with heavy spans, parses each one once
+with BeautifulSoup and times both builders on the parsed table:
+- rowspan: every 1000th row starts cells spanning the rest of the table
+- colspan: wide colspans in every row
+- mixed:   random rowspans and colspans up to 1000 rows / 8 columns
+- huge:    one cell with colspan="1000000", only run with max_colspan=64
+
+The previous builder allocates the whole rows x columns grid up front and
+fills rowspan x colspan grid cells for every cell; the current one yields
+one row at a time. Wall time is measured first, then peak traced memory in
+a second run (the current rows are consumed without being kept), and both
+outputs are compared row by row.
+
+Usage: python benchmarks/bench_span_grid.py [rows]
+"""
+import os
+import sys
+import time
+import random
+import logging
+import tracemalloc
+from bs4 import BeautifulSoup
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, "htmlTable2XLS"))
+
+from htmlTable2XLS import HTMLTableConverter
+
+def legacy_extract_table_data(converter, table):
+    """_extract_table_data as it was before the span grid builder."""
+    rows = table.find_all('tr')
+
+    max_cols = 0
+    for row in rows:
+        col_count = 0
+        for cell in row.find_all(['td', 'th']):
+            colspan = int(cell.get('colspan', 1))
+            col_count += colspan
+        max_cols = max(max_cols, col_count)
+
+    grid = [[None] * max_cols for _ in range(len(rows))]
+
+    for row_idx, row in enumerate(rows):
+        col_idx = 0
+
+        for cell in row.find_all(['td', 'th']):
+            while col_idx < max_cols and grid[row_idx][col_idx] is not None:
+                col_idx += 1
+
+            if col_idx >= max_cols:
+                break
+
+            rowspan = int(cell.get('rowspan', 1))
+            colspan = int(cell.get('colspan', 1))
+            cell_value = converter._get_cell_text(cell)
+
+            for i in range(rowspan):
+                for j in range(colspan):
+                    if row_idx + i < len(grid) and col_idx + j < len(grid[0]):
+                        grid[row_idx + i][col_idx + j] = cell_value
+
+            col_idx += colspan
+
+    return [[cell if cell is not None else '' for cell in row] for row in grid]
+
+def make_table(kind, rows, rnd):
+    lines = ["<table>"]
+    for r in range(rows):
+        cells = []
+        for c in range(6):
+            attrs = ""
+            if kind == "rowspan" and r % 1000 == 0 and c == r // 1000 % 6:
+                attrs = f' rowspan="{rows}"'
+            elif kind == "colspan" and c == 0:
+                attrs = f' colspan="{rnd.randint(1, 40)}"'
+            elif kind == "mixed" and rnd.random() < 0.05:
+                attrs = f' rowspan="{rnd.randint(1, 1000)}" colspan="{rnd.randint(1, 8)}"'
+            elif kind == "huge" and r == 0 and c == 0:
+                attrs = ' colspan="1000000"'
+            cells.append(f"<td{attrs}>r{r}c{c}</td>")
+        lines.append("<tr>" + "".join(cells) + "</tr>")
+    lines.append("</table>")
+    return BeautifulSoup("\n".join(lines), "html.parser").table
+
+def consume(rows):
+    """Exhaust an iterator of rows without keeping them; return (rows, columns)."""
+    count = width = 0
+    for row in rows:
+        count += 1
+        width = len(row)
+    return count, width
+
+def measure(func, *args):
+    """Return (seconds, peak traced MiB) of func(*args), from two separate runs."""
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return elapsed, peak
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    logging.disable(logging.INFO)
+    rnd = random.Random(0)
+
+    for kind in ("rowspan", "colspan", "mixed", "huge"):
+        table = make_table(kind, rows, rnd)
+        converter = HTMLTableConverter(max_colspan=64 if kind == "huge" else None)
+        count, width = consume(converter.iter_table_rows(table))
+        print(f"{kind}: {count:,} rows x {width} columns")
+
+        if kind == "huge":
+            print("  legacy   skipped (would allocate a 100k x 1M grid)")
+        else:
+            legacy_time, legacy_peak = measure(legacy_extract_table_data, converter, table)
+            print(f"  legacy   {legacy_time:8.2f}s {legacy_peak:10.1f} MiB")
+        current_time, current_peak = measure(lambda t: consume(converter.iter_table_rows(t)), table)
+        print(f"  current  {current_time:8.2f}s {current_peak:10.1f} MiB")
+
+        if kind != "huge":
+            same = legacy_extract_table_data(converter, table) == converter._extract_table_data(table)
+            print(f"  speedup {legacy_time / current_time:.2f}x, identical output: {same}")
+
+if __name__ == "__main__":
+    main()
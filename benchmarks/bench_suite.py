@@ -0,0 +1,321 @@
+"""
+End-to-end benchmark suite for the five converters on synthetic data.
+
+Every scenario writes its inputs with a seeded generator, so the same scale
+always produces byte-identical files, and then runs one converter on them:
+- csv2tmx:        a large CSV through csv2tmx.process_csv_file
+- csv2tbx:        a large CSV through csv2tbx.convert_csv_to_tbx
+- json2csv-wide:  per-language bundles with many short keys per section
+- json2csv-deep:  per-language bundles nested dozens of levels deep
+- htmlTable2XLS:  pages of span-heavy tables through HTMLTableConverter
+- mergexls-zip:   a ZIP of many workbooks read from memory (merge_zip_file)
+- mergexls-extract: the same ZIP extracted first (merge_excel_files)
+
+Each scenario runs in a fresh process, so peak memory is not inflated by
+earlier scenarios. Wall time covers the conversion only, not the imports;
+peak memory is the peak resident set size of that process. For every
+scenario the suite reports wall time, throughput in units (rows, keys or
+table rows) and input MB per second, and peak memory, and saves the results
+with the Python version and CPU count as JSON. With --compare, wall times
+are also shown relative to a previous results file.
+
+Usage: python benchmarks/bench_suite.py [--scale N] [--only NAME ...]
+       [--repeat N] [--output results.json] [--compare old.json]
+"""
+import os
+import io
+import sys
+import csv
+import json
+import random
+import logging
+import zipfile
+import argparse
+import platform
+import tempfile
+import time
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+
+try:
+    import resource
+except ImportError:  # Windows: peak memory is not reported
+    resource = None
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for tool in ("csv2tmx", "csv2tbx", "json2csv", "htmlTable2XLS", "mergexls"):
+    sys.path.insert(0, os.path.join(REPO_DIR, tool))
+
+SEED = 0
+LANGUAGES = ("ja_JP", "en_US", "es_ES", "zh_CN", "ko_KR")
+ISO_TIME = "2025-02-10T02:48:19.083972Z"
+TIMESTAMP = "20250210T111732"
+
+# Input generators. Each writes its files below folder and returns the
+# number of units a scenario processes; sizes are multiplied by scale.
+
+def make_tmx_csv(folder, scale):
+    rows = 200_000 * scale
+    rnd = random.Random(SEED)
+    with open(os.path.join(folder, "input.csv"), "w", newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["key", "ja_JP", "en_US"])
+        for i in range(rows):
+            writer.writerow([f"app.screen{i % 97}.label{i}", f"テキスト{i} " * rnd.randint(1, 4),
+                             f"Text <{i}> & \"more\"" if rnd.random() < 0.1 else f"Text {i}"])
+    return rows
+
+def make_tbx_csv(folder, scale):
+    rows = 200_000 * scale
+    rnd = random.Random(SEED)
+    with open(os.path.join(folder, "input.csv"), "w", newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["POS", "Definition", "ja_JP", "en_US", "zh_CN"])
+        for i in range(rows):
+            writer.writerow([rnd.choice(("noun", "verb", "adjective")), f"definition {i}",
+                             f"用語{i}", f"Term <{i}>", f"术语{i}" if rnd.random() < 0.8 else ""])
+    return rows
+
+def write_bundles(folder, make_bundle):
+    """Write one <lang>.json per language; return the total number of leaves."""
+    os.makedirs(os.path.join(folder, "json"))
+    leaves = 0
+    for lang in LANGUAGES:
+        bundle, count = make_bundle(lang)
+        leaves += count
+        with open(os.path.join(folder, "json", f"{lang}.json"), "w", encoding='utf-8') as f:
+            json.dump(bundle, f, ensure_ascii=False)
+    return leaves
+
+def make_wide_bundles(folder, scale):
+    sections, keys = 2_000 * scale, 50
+
+    def make_bundle(lang):
+        rnd = random.Random(f"{SEED}-{lang}")
+        bundle = {f"section{s}": {f"key{k}": f"{lang} {s}-{k}" for k in range(keys) if rnd.random() < 0.95}
+                  for s in range(sections)}
+        return bundle, sum(len(section) for section in bundle.values())
+    return write_bundles(folder, make_bundle)
+
+def make_deep_bundles(folder, scale):
+    branches, depth = 20_000 * scale, 30
+
+    def make_bundle(lang):
+        rnd = random.Random(f"{SEED}-{lang}")
+        root = {}
+        count = 0
+        for b in range(branches):
+            if rnd.random() < 0.05:
+                continue
+            node = root
+            for level in range(depth):
+                node = node.setdefault(f"b{b % (7 + level)}_{level}", {})
+            node[f"leaf{b}"] = [f"{lang} {b}", f"{lang} {b} plural"] if b % 10 == 0 else f"{lang} {b}"
+            count += 2 if b % 10 == 0 else 1
+        return root, count
+    return write_bundles(folder, make_bundle)
+
+def make_span_pages(folder, scale):
+    pages, rows = 10 * scale, 2_000
+    rnd = random.Random(SEED)
+    os.makedirs(os.path.join(folder, "html"))
+    table_rows = 0
+    for page in range(pages):
+        parts = ["<html><body><p>Intro</p>",
+                 # A table of another kind that must be skipped
+                 '<div class="table-wrap"><div class="table-block"><table><tr><th>Other</th></tr>'
+                 + "<tr><td>x</td></tr>" * 200 + "</table></div></div>",
+                 '<div class="table-wrap"><div class="table-block"><table>',
+                 "<tr><th>タイトル</th><th>ja_JP</th><th>en_US</th><th>es_ES</th><th>zh_CN</th><th>Note</th></tr>"]
+        for r in range(rows):
+            cells = []
+            for c in range(6):
+                attrs = ""
+                if c == 0 and r % 50 == 0:
+                    attrs = ' rowspan="50"'
+                elif c == 0:
+                    continue
+                elif rnd.random() < 0.05:
+                    attrs = f' rowspan="{rnd.randint(2, 20)}" colspan="{rnd.randint(1, 3)}"'
+                cells.append(f"<td{attrs}><p>r{r}c{c} &amp; text</p></td>")
+            parts.append("<tr>" + "".join(cells) + "</tr>")
+        parts.append("</table></div></div></body></html>")
+        with open(os.path.join(folder, "html", f"page{page:03d}.html"), "w", encoding='utf-8') as f:
+            f.write("\n".join(parts))
+        table_rows += rows + 1
+    return table_rows
+
+def make_workbook_zip(folder, scale):
+    from openpyxl import Workbook
+
+    files, rows = 100 * scale, 2_000
+    rnd = random.Random(SEED)
+    keys = [(f"screen{i % 50}.label{i}", f"ラベル{i}") for i in range(rows)]
+    written = 0
+    with zipfile.ZipFile(os.path.join(folder, "input.zip"), "w", zipfile.ZIP_DEFLATED) as zf:
+        for n in range(files):
+            wb = Workbook(write_only=True)
+            ws = wb.create_sheet("Sheet1")
+            ws.append(["key", "ja_JP", f"lang{n:03d}", "Comment"])
+            for key, source in keys:
+                if rnd.random() < 0.98:
+                    ws.append([key, source, f"text {n} {key}", "note"])
+                    written += 1
+            data = io.BytesIO()
+            wb.save(data)
+            zf.writestr(f"file{n:03d}.xlsx", data.getvalue())
+    return written
+
+# Scenario runners. Each is called in the benchmark process after the inputs
+# exist, imports its converter and returns the function to time.
+
+def run_csv2tmx(folder):
+    import csv2tmx
+    return lambda: csv2tmx.process_csv_file(os.path.join(folder, "input.csv"), os.path.join(folder, "output.tmx"),
+                                            "key", "ja_JP", "en_US", TIMESTAMP)
+
+def run_csv2tbx(folder):
+    import csv2tbx
+    return lambda: csv2tbx.convert_csv_to_tbx(os.path.join(folder, "input.csv"), os.path.join(folder, "output.tbx"),
+                                              ISO_TIME)
+
+def run_json2csv(folder):
+    from pathlib import Path
+    from json2csv import JsonTranslationHandler, TranslationConfig
+
+    def run():
+        handler = JsonTranslationHandler(TranslationConfig(Path(folder, "json"), Path(folder, "output.csv")))
+        handler.load_json_files()
+        handler.write_csv_output()
+    return run
+
+def run_html_tables(folder):
+    from htmlTable2XLS import HTMLTableConverter
+    return lambda: HTMLTableConverter(input_dir=os.path.join(folder, "html")).process_files(force=True)
+
+def run_mergexls_zip(folder):
+    import mergexls
+    return lambda: mergexls.merge_zip_file(os.path.join(folder, "input.zip"))
+
+def run_mergexls_extract(folder):
+    import mergexls
+    return lambda: mergexls.merge_extracted(os.path.join(folder, "input.zip"), folder)
+
+# name -> (input generator, runner, unit)
+SCENARIOS = {
+    "csv2tmx": (make_tmx_csv, run_csv2tmx, "rows"),
+    "csv2tbx": (make_tbx_csv, run_csv2tbx, "rows"),
+    "json2csv-wide": (make_wide_bundles, run_json2csv, "keys"),
+    "json2csv-deep": (make_deep_bundles, run_json2csv, "keys"),
+    "htmlTable2XLS": (make_span_pages, run_html_tables, "table rows"),
+    "mergexls-zip": (make_workbook_zip, run_mergexls_zip, "rows"),
+    "mergexls-extract": (make_workbook_zip, run_mergexls_extract, "rows"),
+}
+
+def folder_size(folder):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(folder) for name in files)
+
+def peak_rss_mib():
+    """
+    Peak resident set size of this process in MiB, or None if unknown.
+    On Linux this is VmHWM, which starts over with the new program; ru_maxrss
+    would keep the peak of the parent the worker process was forked from.
+    """
+    try:
+        with open("/proc/self/status", encoding='utf-8') as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 2**10
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+def _run_scenario(name, folder):
+    """Run one scenario in a fresh worker process; return (seconds, peak RSS MiB)."""
+    logging.disable(logging.CRITICAL)
+    run = SCENARIOS[name][1](folder)
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+    return elapsed, peak_rss_mib()
+
+def measure(name, folder, repeat):
+    """Return the best wall time and the highest peak memory over repeat fresh processes."""
+    best, peak = float("inf"), None
+    for _ in range(repeat):
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+            elapsed, rss = executor.submit(_run_scenario, name, folder).result()
+        best = min(best, elapsed)
+        if rss is not None:
+            peak = max(peak or 0, rss)
+    return best, peak
+
+def load_previous(path):
+    with open(path, encoding='utf-8') as f:
+        return {result["scenario"]: result for result in json.load(f)["results"]}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the converters on synthetic data.")
+    parser.add_argument("--scale", type=int, default=1, help="multiply the input sizes by N (default: %(default)s)")
+    parser.add_argument("--only", nargs="+", choices=SCENARIOS, help="run only these scenarios")
+    parser.add_argument("--repeat", type=int, default=1, help="run every scenario N times and keep the best time")
+    parser.add_argument("--output", default="bench_results.json", help="JSON file to save the results to (default: %(default)s)")
+    parser.add_argument("--compare", help="results file of an earlier run to compare wall times with")
+    args = parser.parse_args()
+
+    previous = load_previous(args.compare) if args.compare else {}
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        generated = {}
+        for name in args.only or SCENARIOS:
+            make, _, unit = SCENARIOS[name]
+            # Scenarios with the same generator share one set of inputs
+            if make not in generated:
+                folder = os.path.join(tmp, make.__name__)
+                os.makedirs(folder)
+                units = make(folder, args.scale)
+                generated[make] = (folder, units, folder_size(folder))
+            folder, units, input_bytes = generated[make]
+
+            elapsed, peak = measure(name, folder, args.repeat)
+            result = {
+                "scenario": name,
+                "units": units,
+                "unit": unit,
+                "input_bytes": input_bytes,
+                "wall_seconds": round(elapsed, 4),
+                "units_per_second": round(units / elapsed, 1),
+                "input_mb_per_second": round(input_bytes / 2**20 / elapsed, 3),
+                "peak_rss_mib": round(peak, 1) if peak is not None else None,
+            }
+            results.append(result)
+
+            line = (f"{name:<17} {units:>10,} {unit:<10} {elapsed:8.2f}s "
+                    f"{result['units_per_second']:>12,.0f} {unit}/s {result['input_mb_per_second']:8.2f} MB/s")
+            if peak is not None:
+                line += f" {peak:8.1f} MiB peak"
+            if name in previous:
+                line += f"  ({elapsed / previous[name]['wall_seconds']:.2f}x of previous time)"
+            print(line)
+
+    with open(args.output, "w", encoding='utf-8') as f:
+        json.dump({
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "scale": args.scale,
+            "repeat": args.repeat,
+            "results": results,
+        }, f, indent=1)
+    print(f"Results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
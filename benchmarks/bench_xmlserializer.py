@@ -0,0 +1,138 @@
+"""
+Benchmark the shared XML serializer against the previous per-row writers.
+
+Generates a synthetic CSV for each tool, converts it with the legacy code path
+(xml.sax.saxutils.escape on every field, re-escaped context and POS, several
+write() calls per row) and with the current csv2tmx/csv2tbx, which render
+through common.xmlserializer and write WRITE_BATCH entries per write() call.
+Checks that both outputs are byte-identical and prints the best-of-3
+throughput of each.
+
+Usage: python benchmarks/bench_xmlserializer.py [rows]
+"""
+import os
+import sys
+import io
+import csv
+import time
+import contextlib
+import filecmp
+import tempfile
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "csv2tmx"))
+sys.path.insert(0, os.path.join(REPO_DIR, "csv2tbx"))
+
+import csv2tmx
+import csv2tbx
+from common import xmlserializer
+
+TIMESTAMP = "20250210T111732"
+ISO_TIME = "2025-02-10T02:48:19.083972Z"
+REPEAT = 3
+
+def legacy_csv_to_tmx(file_path, tmx_file_path, key_id, source_lang, target_lang):
+    """csv2tmx.process_csv_file as it was before the shared serializer."""
+    with open(file_path, newline='', encoding='utf-8') as csvfile:
+        rows = list(csv.DictReader(csvfile))
+        total_rows = len(rows)
+        with open(tmx_file_path, "w", encoding="utf-8") as tmxfile:
+            tmxfile.write(xmlserializer.generate_tmx_header(source_lang))
+            for i, row in enumerate(rows):
+                key = escape(row.get(key_id, "N/A"))
+                source_text = escape(row.get(source_lang, "N/A"))
+                target_text = escape(row.get(target_lang, "N/A"))
+                prev_source = escape(rows[i - 1].get(source_lang, "N/A")) if i > 0 else ""
+                next_source = escape(rows[i + 1].get(source_lang, "N/A")) if i < total_rows - 1 else ""
+                tmxfile.write(f"""
+  <tu>
+    <prop type="x-segment-id">{key}</prop>
+    <prop type="x-previous-source-text">{prev_source}</prop>
+    <prop type="x-next-source-text">{next_source}</prop>
+    <tuv xml:lang="{source_lang}" creationdate="{TIMESTAMP}" lastusagedate="{TIMESTAMP}">
+      <seg>{source_text}</seg>
+    </tuv>
+    <tuv xml:lang="{target_lang}" creationdate="{TIMESTAMP}" lastusagedate="{TIMESTAMP}">
+      <seg>{target_text}</seg>
+    </tuv>
+  </tu>""")
+            tmxfile.write(xmlserializer.generate_tmx_footer())
+
+def legacy_csv_to_tbx(csv_path, tbx_path, iso_time):
+    """csv2tbx.convert_csv_to_tbx as it was before the shared serializer."""
+    with open(csv_path, newline='', encoding='utf-8') as csvfile, open(tbx_path, "w", encoding="utf-8") as tbxfile:
+        tbxfile.write(xmlserializer.TBX_HEADER)
+        for row in csv.DictReader(csvfile):
+            definition = escape(row.get("Definition", ""))
+            pos = escape(row.get("POS", ""))
+            tbxfile.write(f"""
+<termEntry>
+<descrip type="Creator">{Path(csv_path).name}</descrip>
+<descrip type="xDate_CreateTime">{iso_time}</descrip>
+<descrip type="definition">{definition}</descrip>
+""")
+            for lang, term in row.items():
+                if lang in csv2tbx.LANGUAGES and term:
+                    tbxfile.write(f"""
+<langSet xml:lang="{escape(lang)}">
+<tig>
+<term>{escape(term)}</term>
+<termNote type="partOfSpeech">{escape(pos)}</termNote>
+</tig>
+</langSet>
+""")
+            tbxfile.write("</termEntry>\n")
+        tbxfile.write(xmlserializer.TBX_FOOTER)
+
+def write_tmx_input(path, rows):
+    with open(path, "w", newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["key", "ja_JP", "en_US"])
+        for i in range(rows):
+            writer.writerow([f"app.screen{i % 97}.label{i}", f"テキスト{i}", f"Text <{i}> & more"])
+
+def write_tbx_input(path, rows):
+    with open(path, "w", newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["POS", "Definition", "ja_JP", "en_US", "zh_CN"])
+        for i in range(rows):
+            writer.writerow(["noun" if i % 3 else "verb", f"definition {i}", f"用語{i}", f"Term <{i}>", f"术语{i}"])
+
+def timed(label, rows, func, *args):
+    """Run func REPEAT times and print the best wall time."""
+    elapsed = float("inf")
+    for _ in range(REPEAT):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func(*args)
+            elapsed = min(elapsed, time.perf_counter() - start)
+    print(f"  {label:<8} {elapsed:8.2f}s {rows / elapsed:12,.0f} rows/s")
+    return elapsed
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    csv2tmx.get_current_datetime = lambda: TIMESTAMP
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmx_input = os.path.join(tmp, "tmx_input.csv")
+        tbx_input = os.path.join(tmp, "tbx_input.csv")
+        write_tmx_input(tmx_input, rows)
+        write_tbx_input(tbx_input, rows)
+
+        print(f"csv2tmx, {rows:,} rows")
+        legacy = timed("legacy", rows, legacy_csv_to_tmx, tmx_input, os.path.join(tmp, "legacy.tmx"), "key", "ja_JP", "en_US")
+        current = timed("current", rows, csv2tmx.process_csv_file, tmx_input, os.path.join(tmp, "current.tmx"), "key", "ja_JP", "en_US")
+        same = filecmp.cmp(os.path.join(tmp, "legacy.tmx"), os.path.join(tmp, "current.tmx"), shallow=False)
+        print(f"  speedup {legacy / current:.2f}x, identical output: {same}")
+
+        print(f"csv2tbx, {rows:,} rows")
+        legacy = timed("legacy", rows, legacy_csv_to_tbx, tbx_input, os.path.join(tmp, "legacy.tbx"), ISO_TIME)
+        current = timed("current", rows, csv2tbx.convert_csv_to_tbx, tbx_input, os.path.join(tmp, "current.tbx"), ISO_TIME)
+        same = filecmp.cmp(os.path.join(tmp, "legacy.tbx"), os.path.join(tmp, "current.tbx"), shallow=False)
+        print(f"  speedup {legacy / current:.2f}x, identical output: {same}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+One entry point for all converters: python cli.py <tool> [options]
+
+Only the module of the selected tool is imported, and the tools import their
+heavy dependencies (pandas, openpyxl, BeautifulSoup) only when they need
+them, so starting a conversion costs little more than starting Python.
+python cli.py batch <jobs.json> runs many conversions in one process, so
+modules that were loaded for one job are already loaded for the next.
+python cli.py watch <jobs.json> stays running and converts input files as
+they are added or changed in the folders of the jobs.
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import importlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import redirect_stdout
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, REPO_DIR)
+from common.watch import DirectoryPoller
+
+# Tool name -> summary; kept here so the top-level help imports no tool module.
+# Every tool lives in <name>/<name>.py and provides add_arguments(parser) and run(args).
+TOOLS = {
+    "csv2tmx": "Convert the CSV files in the current directory tree to TMX.",
+    "csv2tbx": "Convert the CSV files in the current directory tree to TBX.",
+    "tmx2csv": "Convert the TMX and TBX files in the current directory tree back to CSV.",
+    "json2csv": "Merge per-language JSON translation files into one CSV file.",
+    "htmlTable2XLS": "Convert HTML tables in the current directory tree to Excel.",
+    "mergexls": "Merge the Excel files of a ZIP file on their first two columns.",
+}
+
+# Tool name -> input suffixes, for the tools that can be watched. Their run(args, paths)
+# converts just the given inputs, except the tools in WATCH_WHOLE_FOLDER.
+WATCH_SUFFIXES = {
+    "csv2tmx": (".csv",),
+    "csv2tbx": (".csv",),
+    "json2csv": (".json",),
+    "htmlTable2XLS": (".html",),
+    "mergexls": (".zip",),
+}
+# Tools whose output depends on every input, so each run converts the whole folder
+WATCH_WHOLE_FOLDER = {"json2csv"}
+
+def load_tool(name):
+    """Import the module of a tool; later calls return the loaded module."""
+    tool_dir = os.path.join(REPO_DIR, name)
+    if tool_dir not in sys.path:
+        sys.path.insert(0, tool_dir)
+    return importlib.import_module(name)
+
+def tool_parser(name, module, prog=None):
+    parser = argparse.ArgumentParser(prog=prog or f"cli.py {name}", description=module.DESCRIPTION)
+    module.add_arguments(parser)
+    return parser
+
+def run_tool(name, argv, prog=None):
+    """Parse argv with the options of a tool and run it."""
+    module = load_tool(name)
+    module.run(tool_parser(name, module, prog).parse_args(argv))
+
+def load_jobs(path):
+    """
+    Read a batch manifest: a JSON list of jobs, or an object with a "jobs"
+    list. Every job is {"tool": name, "args": [...], "cwd": folder}; args and
+    cwd are optional, and a relative cwd is taken from the manifest's folder.
+    In watch mode, "path" is the folder to watch, relative to cwd (default: cwd).
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    jobs = data["jobs"] if isinstance(data, dict) else data
+    base_dir = os.path.dirname(os.path.abspath(path))
+
+    checked = []
+    for number, job in enumerate(jobs, start=1):
+        if job.get("tool") not in TOOLS:
+            raise ValueError(f"Job {number}: unknown tool {job.get('tool')!r}, expected one of {', '.join(TOOLS)}")
+        args = job.get("args", [])
+        if not isinstance(args, list):
+            raise ValueError(f"Job {number}: args must be a list of strings")
+        cwd = os.path.normpath(os.path.join(base_dir, job.get("cwd", ".")))
+        path = os.path.normpath(os.path.join(cwd, job.get("path", ".")))
+        checked.append({"tool": job["tool"], "args": [str(arg) for arg in args], "cwd": cwd, "path": path})
+    return checked
+
+def run_batch(jobs, stop_on_error=False):
+    """
+    Run the jobs one after another in this process, each in its own working
+    directory. A job fails when it raises or exits with a non-zero status;
+    the other jobs still run unless stop_on_error is set.
+    Returns the number of failed jobs.
+    """
+    total = len(jobs)
+    ran = failed = 0
+    start_dir = os.getcwd()
+    batch_start = time.perf_counter()
+
+    for done, job in enumerate(jobs, start=1):
+        print(f"[{done}/{total}] {job['tool']} {' '.join(job['args'])} (in {job['cwd']})")
+        start = time.perf_counter()
+        ok = True
+        try:
+            os.chdir(job["cwd"])
+            run_tool(job["tool"], job["args"], prog=job["tool"])
+        except SystemExit as e:
+            ok = e.code in (None, 0)
+        except Exception as e:
+            print(f"Error in job {done}: {type(e).__name__}: {e}")
+            ok = False
+        finally:
+            os.chdir(start_dir)
+        ran += 1
+        print(f"[{done}/{total}] {'done' if ok else 'FAILED'} in {time.perf_counter() - start:.2f}s")
+
+        if not ok:
+            failed += 1
+            if stop_on_error:
+                break
+
+    print(f"Jobs run: {ran}/{total}, Failed: {failed} ({time.perf_counter() - batch_start:.2f}s)")
+    return failed
+
+def _watch_job(tool, cwd, args, paths):
+    """
+    Run one conversion of watch mode in a worker process, with its output
+    captured. Returns (ok, output, seconds). The worker keeps the modules it
+    loaded, so later jobs of the same tool start without importing anything.
+    """
+    start = time.perf_counter()
+    output = io.StringIO()
+    ok = True
+    with redirect_stdout(output):
+        try:
+            os.chdir(cwd)
+            module = load_tool(tool)
+            if paths is None:
+                module.run(args)
+            else:
+                module.run(args, paths)
+        except SystemExit as e:
+            ok = e.code in (None, 0)
+        except Exception as e:
+            print(f"Error: {type(e).__name__}: {e}")
+            ok = False
+    return ok, output.getvalue(), time.perf_counter() - start
+
+def run_watch(jobs, interval=1.0, settle=2.0, workers=1, skip_existing=False):
+    """
+    Poll the folder of every job and run the job on the inputs that were added
+    or changed, until interrupted. Inputs that exist at startup are converted
+    first unless skip_existing is set; tools with a build manifest skip the
+    ones that are up to date.
+
+    Conversions run in a pool of workers processes. A job never runs twice at
+    the same time: changes seen while it runs are collected and converted in
+    one run when it finishes, so at most one run per job waits in the queue.
+    """
+    watches = []
+    for job in jobs:
+        if job["tool"] not in WATCH_SUFFIXES:
+            raise ValueError(f"{job['tool']} cannot be watched, expected one of {', '.join(WATCH_SUFFIXES)}")
+        module = load_tool(job["tool"])
+        args = tool_parser(job["tool"], module, prog=job["tool"]).parse_args(job["args"])
+        poller = DirectoryPoller(job["path"], WATCH_SUFFIXES[job["tool"]], settle)
+        watches.append((job, args, poller))
+
+    queued = {}   # watch number -> inputs to convert
+    running = {}  # watch number -> (future, inputs)
+    for number, (job, _, poller) in enumerate(watches):
+        existing = poller.prime()
+        print(f"Watching {job['path']} for {job['tool']} ({len(existing)} inputs)")
+        if existing and not skip_existing:
+            queued[number] = set(existing)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        try:
+            while True:
+                now = time.monotonic()
+                for number, (job, _, poller) in enumerate(watches):
+                    ready, deleted = poller.poll(now)
+                    for path in ready:
+                        print(f"Changed: {path}")
+                    for path in deleted:
+                        print(f"Deleted: {path}")
+                    if ready or deleted:
+                        # Deleted inputs need a run too, so their outputs are removed
+                        queued.setdefault(number, set()).update(ready)
+
+                for number, (future, inputs) in list(running.items()):
+                    if not future.done():
+                        continue
+                    del running[number]
+                    job = watches[number][0]
+                    try:
+                        ok, output, seconds = future.result()
+                    except Exception as e:
+                        ok, output, seconds = False, f"Error: {type(e).__name__}: {e}\n", 0.0
+                    print(f"{job['tool']} in {job['path']}: {len(inputs)} inputs")
+                    print(output, end="")
+                    print(f"{job['tool']} {'done' if ok else 'FAILED'} in {seconds:.2f}s")
+
+                for number in sorted(queued):
+                    if number in running or len(running) >= workers:
+                        continue
+                    job, args, _ = watches[number]
+                    inputs = queued.pop(number)
+                    paths = None
+                    if job["tool"] not in WATCH_WHOLE_FOLDER:
+                        # Paths are handed to the tool relative to its working directory
+                        paths = sorted(os.path.join(".", os.path.relpath(path, job["cwd"])) for path in inputs
+                                       if os.path.exists(path))
+                    running[number] = (executor.submit(_watch_job, job["tool"], job["cwd"], args, paths), inputs)
+
+                # Wake up early when a conversion finishes, so queued changes start at once
+                if running:
+                    wait([future for future, _ in running.values()], timeout=interval, return_when=FIRST_COMPLETED)
+                else:
+                    time.sleep(interval)
+        except KeyboardInterrupt:
+            print("Stopping; waiting for running conversions to finish...")
+            executor.shutdown(wait=True, cancel_futures=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run one of the converters, or a batch of conversions in one process.",
+                                     epilog="Run 'cli.py <tool> --help' for the options of a tool.")
+    subparsers = parser.add_subparsers(dest="command", metavar="command", required=True)
+    for name, summary in TOOLS.items():
+        # Options are parsed by the tool itself once its module is loaded
+        subparsers.add_parser(name, help=summary, add_help=False)
+    batch_parser = subparsers.add_parser("batch", help="run the jobs of a JSON manifest in one process")
+    batch_parser.add_argument("jobs", help='JSON file with a list of {"tool": ..., "args": [...], "cwd": ...} jobs')
+    batch_parser.add_argument("--stop-on-error", action="store_true", help="stop at the first job that fails")
+    watch_parser = subparsers.add_parser("watch", help="keep running and convert inputs as they are added or changed")
+    watch_parser.add_argument("jobs", help='JSON file with the jobs to watch, like for batch; "path" sets the folder to watch')
+    watch_parser.add_argument("--interval", type=float, default=1.0, help="seconds between scans (default: %(default)s)")
+    watch_parser.add_argument("--settle", type=float, default=2.0,
+                              help="seconds a file must stay unchanged before it is converted (default: %(default)s)")
+    watch_parser.add_argument("--workers", type=int, default=1, help="conversions running at the same time (default: %(default)s)")
+    watch_parser.add_argument("--skip-existing", action="store_true", help="only convert inputs added or changed after startup")
+
+    args, rest = parser.parse_known_args()
+    if args.command not in ("batch", "watch"):
+        run_tool(args.command, rest)
+        return
+
+    if rest:
+        parser.error(f"unrecognized arguments: {' '.join(rest)}")
+    try:
+        jobs = load_jobs(args.jobs)
+    except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+        parser.error(f"cannot read batch manifest {args.jobs}: {e}")
+    if args.command == "watch":
+        try:
+            run_watch(jobs, args.interval, args.settle, max(1, args.workers), args.skip_existing)
+        except ValueError as e:
+            parser.error(str(e))
+    elif run_batch(jobs, args.stop_on_error):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
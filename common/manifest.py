@@ -0,0 +1,114 @@
+"""Persistent build manifest for incremental rebuilds of the directory-walking converters."""
+import os
+import json
+import hashlib
+
+def hash_file(path):
+    """Return the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class BuildManifest:
+    """
+    Record, for every converted input, its size, mtime, content hash and the
+    outputs it produced, together with the settings of the run.
+
+    An input is up to date when the settings are unchanged, its outputs still
+    exist and its size and mtime match. When only the mtime differs, the content
+    hash decides, so touched but unchanged files are not rebuilt either.
+    """
+
+    def __init__(self, path, settings, force=False):
+        self.path = path
+        self.settings = json.loads(json.dumps(settings))  # Normalize tuples etc. as stored
+        self.entries = {}
+        self.seen = set()
+        self.recorded = set()
+        # With force or changed settings nothing is up to date, but old entries
+        # are still loaded so outputs of deleted inputs can be pruned.
+        self.rebuild_all = force
+
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable manifest {path}: {e}")
+            return
+        self.entries = data.get("inputs", {})
+        if data.get("settings") != self.settings:
+            self.rebuild_all = True
+
+    def is_up_to_date(self, input_path, outputs=None):
+        """
+        Return True if input_path does not need converting again.
+        outputs lists the files the input is expected to produce; None accepts
+        whatever the last run recorded, e.g. no outputs for a skipped input.
+        """
+        key = os.path.normpath(input_path)
+        self.seen.add(key)
+        entry = self.entries.get(key)
+        if entry is None or self.rebuild_all:
+            return False
+        if outputs is not None and sorted(entry["outputs"]) != sorted(os.path.normpath(p) for p in outputs):
+            return False
+        if not all(os.path.exists(p) for p in entry["outputs"]):
+            return False
+
+        stat = os.stat(input_path)
+        if stat.st_size != entry["size"]:
+            return False
+        if stat.st_mtime_ns != entry["mtime_ns"]:
+            if hash_file(input_path) != entry["sha256"]:
+                return False
+            entry["mtime_ns"] = stat.st_mtime_ns
+        return True
+
+    def record(self, input_path, outputs):
+        """Remember that input_path was converted into outputs."""
+        key = os.path.normpath(input_path)
+        self.seen.add(key)
+        self.recorded.add(key)
+        stat = os.stat(input_path)
+        self.entries[key] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": hash_file(input_path),
+            "outputs": [os.path.normpath(p) for p in outputs],
+        }
+
+    def prune(self, delete_outputs=True):
+        """
+        Drop inputs that were not seen in this run and no longer exist, deleting
+        their outputs unless delete_outputs is False. Returns the dropped inputs.
+        """
+        removed = []
+        for key in list(self.entries):
+            if key in self.seen or os.path.exists(key):
+                continue
+            outputs = self.entries.pop(key)["outputs"]
+            removed.append(key)
+            if not delete_outputs:
+                continue
+            for output in outputs:
+                if os.path.exists(output):
+                    os.remove(output)
+                    print(f"Removed: {output}")
+        return removed
+
+    def save(self):
+        """
+        Write the manifest atomically. After a full rebuild only the inputs
+        converted in this run are kept, so failed ones are retried next time.
+        """
+        entries = self.entries
+        if self.rebuild_all:
+            entries = {key: entry for key, entry in entries.items() if key in self.recorded}
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"settings": self.settings, "inputs": entries}, f, ensure_ascii=False, indent=1)
+        os.replace(temp_path, self.path)
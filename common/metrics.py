@@ -0,0 +1,165 @@
+"""Per-stage timers and counters shared by the converters, written as a metrics file at the end of a run."""
+import os
+import sys
+import json
+import time
+import cProfile
+import pstats
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+class Metrics:
+    """
+    Wall time and call count per named stage, counters, and values recorded
+    per input file.
+
+    Stage times are exclusive: time spent in a stage nested inside another
+    one counts only for the inner stage, so the stages of a run add up to at
+    most its wall time and show where that time went. Times measured in
+    worker processes are merged into the main process, so with several
+    workers the stages can add up to more than the wall time of the run.
+    """
+
+    def __init__(self):
+        self.stages = {}    # name -> {"seconds": float, "calls": int}
+        self.counters = {}  # name -> number
+        self.files = {}     # input path -> {name: value}
+        self._nested = []   # Time spent in nested stages, per open stage
+
+    def add_time(self, name, seconds, calls=1):
+        entry = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+        entry["seconds"] += seconds
+        entry["calls"] += calls
+
+    def _enter(self):
+        self._nested.append(0.0)
+        return time.perf_counter()
+
+    def _exit(self, start):
+        """Close the innermost open stage; return its time without nested stages."""
+        elapsed = time.perf_counter() - start
+        nested = self._nested.pop()
+        if self._nested:
+            self._nested[-1] += elapsed
+        return elapsed - nested
+
+    @contextmanager
+    def stage(self, name):
+        """Time the body of a with block as one call of stage name."""
+        start = self._enter()
+        try:
+            yield
+        finally:
+            self.add_time(name, self._exit(start))
+
+    def timed(self, name, iterable):
+        """
+        Yield the items of iterable, adding the time spent producing them to
+        stage name. Time spent by the consumer between items is not counted,
+        so interleaved stages of a streaming pipeline are kept apart.
+        """
+        iterator = iter(iterable)
+        elapsed = 0.0
+        try:
+            while True:
+                start = self._enter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += self._exit(start)
+                yield item
+        finally:
+            self.add_time(name, elapsed)
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def record_file(self, path, **values):
+        """
+        Record values such as rows, bytes and seconds for one input file.
+        Integer values are also added to the counter of the same name, so the
+        counters hold the totals over all files.
+        """
+        self.files.setdefault(os.path.normpath(str(path)), {}).update(values)
+        for name, value in values.items():
+            if isinstance(value, int):
+                self.count(name, value)
+
+    def snapshot(self):
+        """Return the metrics as plain data that can be sent between processes and merged."""
+        return {"stages": self.stages, "counters": self.counters, "files": self.files}
+
+    def merge(self, snapshot):
+        """Add the metrics of a snapshot, e.g. one taken in a worker process."""
+        for name, entry in snapshot["stages"].items():
+            self.add_time(name, entry["seconds"], entry["calls"])
+        for name, value in snapshot["counters"].items():
+            self.count(name, value)
+        for path, values in snapshot["files"].items():
+            self.files.setdefault(path, {}).update(values)
+
+    def reset(self):
+        self.stages = {}
+        self.counters = {}
+        self.files = {}
+        self._nested = []
+
+# Metrics of the current process
+METRICS = Metrics()
+
+def add_metrics_arguments(parser, tool):
+    """Add the --metrics and --profile options to a converter's argument parser."""
+    parser.add_argument("--metrics", default=f".{tool}_metrics.json",
+                        help="file to write stage timings and counters to at the end of the run (default: %(default)s)")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="run under cProfile, save the stats to PATH and print the slowest functions "
+                             "(the main process only, not worker processes)")
+
+@contextmanager
+def record_run(tool, metrics_path, profile_path=None, settings=None):
+    """
+    Collect METRICS for the body of a with block and write them to
+    metrics_path as JSON when it ends, also when it fails or returns early.
+    With profile_path set, the block also runs under cProfile; the stats are
+    saved to profile_path and the functions with the most cumulative time
+    are printed.
+    """
+    METRICS.reset()
+    started = datetime.now(timezone.utc)
+    start = time.perf_counter()
+    profiler = cProfile.Profile() if profile_path else None
+    status = "ok"
+    if profiler:
+        profiler.enable()
+    try:
+        yield METRICS
+    except BaseException as e:
+        status = f"error: {type(e).__name__}: {e}"
+        raise
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+        write_metrics(metrics_path, {
+            "tool": tool,
+            "started": started.isoformat(timespec="seconds"),
+            "wall_seconds": round(time.perf_counter() - start, 6),
+            "status": status,
+            "settings": settings or {},
+            "profile": profile_path,
+            **METRICS.snapshot(),
+        })
+        if profiler:
+            pstats.Stats(profiler, stream=sys.stdout).sort_stats("cumulative").print_stats(20)
+
+def write_metrics(path, data):
+    """Write a metrics file atomically; a failure is reported but does not fail the run."""
+    temp_path = path + ".tmp"
+    try:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1, default=str)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Could not write metrics file {path}: {e}")
@@ -0,0 +1,65 @@
+"""Process-pool runner shared by the directory-walking converters."""
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+
+from common.metrics import METRICS
+
+def resolve_workers(workers):
+    """Return the number of worker processes to use; 0 or None means one per CPU core."""
+    return workers or os.cpu_count() or 1
+
+def _run_job(job):
+    """
+    Run one conversion in a worker process with its output and metrics captured.
+    Returns (status, output, metrics), where status is True when the file was
+    converted, None when it was skipped and False when it failed, and metrics
+    is a METRICS snapshot of this job only.
+    """
+    func, path, args = job
+    METRICS.reset()
+    output = io.StringIO()
+    with redirect_stdout(output):
+        try:
+            status = func(*args)
+        except Exception as e:
+            print(f"Error processing {path}: {e}")
+            status = False
+    return status, output.getvalue(), METRICS.snapshot()
+
+def run_parallel(func, jobs, workers, summary=True):
+    """
+    Run func(*args) for every (path, args) job in a process pool.
+    func must be a module-level function so it can be sent to the workers.
+    Each job keeps its own error handling: an exception only fails that job.
+    Job output and progress are printed in job order, not completion order,
+    so logs are the same from run to run. The metrics of every job are merged
+    into METRICS of this process. A summary of converted, skipped and failed
+    jobs is printed at the end, unless summary is False because the caller
+    prints its own. Returns the status of every job, in job order: True when
+    converted, None when skipped and False when failed.
+    """
+    workers = resolve_workers(workers)
+    total = len(jobs)
+    statuses = []
+    converted = skipped = failed = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunksize = max(1, total // (workers * 8))
+        results = executor.map(_run_job, [(func, path, args) for path, args in jobs], chunksize=chunksize)
+        for done, ((path, _), (status, output, metrics)) in enumerate(zip(jobs, results), start=1):
+            print(f"[{done}/{total}] {path}")
+            print(output, end="")
+            METRICS.merge(metrics)
+            statuses.append(status)
+            if status:
+                converted += 1
+            elif status is None:
+                skipped += 1
+            else:
+                failed += 1
+
+    if summary:
+        print(f"Converted: {converted}, Skipped: {skipped}, Failed: {failed} ({workers} workers)")
+    return statuses
@@ -0,0 +1,80 @@
+"""Polling file watcher with debouncing, used by the watch mode of cli.py."""
+import os
+
+def is_temporary(name):
+    """Return True for hidden files and lock files of editors and office programs."""
+    return name.startswith((".", "~$"))
+
+class DirectoryPoller:
+    """
+    Find new, changed and deleted input files under a folder by comparing
+    stat snapshots, without reading or hashing any file.
+
+    A new or changed file is only reported once its size and mtime have not
+    changed for settle seconds, so files that are still being written or
+    copied are not converted half-written. Hidden files and folders are
+    ignored, which also keeps manifests and metrics files out of the scan.
+    """
+
+    def __init__(self, root, suffixes, settle=2.0):
+        self.root = root
+        self.suffixes = tuple(suffixes)
+        self.settle = settle
+        self.known = {}    # path -> (size, mtime_ns) when last reported
+        self.pending = {}  # path -> ((size, mtime_ns), time first seen with that stat)
+
+    def scan(self):
+        """Return {path: (size, mtime_ns)} of the matching files under root."""
+        snapshot = {}
+        folders = [self.root]
+        while folders:
+            folder = folders.pop()
+            try:
+                entries = list(os.scandir(folder))
+            except OSError:
+                continue  # Deleted or unreadable meanwhile
+            for entry in entries:
+                if is_temporary(entry.name):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        folders.append(entry.path)
+                    elif entry.name.endswith(self.suffixes):
+                        stat = entry.stat()
+                        snapshot[entry.path] = (stat.st_size, stat.st_mtime_ns)
+                except OSError:
+                    continue
+        return snapshot
+
+    def prime(self):
+        """Take the files that exist now as known; return their paths, sorted."""
+        self.known = self.scan()
+        self.pending = {}
+        return sorted(self.known)
+
+    def poll(self, now):
+        """
+        Scan once and return (ready, deleted): the sorted paths that are new or
+        changed and have settled, and the paths that disappeared.
+        now is a time.monotonic() value.
+        """
+        snapshot = self.scan()
+        ready = []
+        for path, stat in snapshot.items():
+            if self.known.get(path) == stat:
+                self.pending.pop(path, None)
+                continue
+            seen = self.pending.get(path)
+            if seen is None or seen[0] != stat:
+                self.pending[path] = (stat, now)
+            elif now - seen[1] >= self.settle:
+                del self.pending[path]
+                self.known[path] = stat
+                ready.append(path)
+
+        deleted = [path for path in self.known if path not in snapshot]
+        for path in deleted:
+            del self.known[path]
+        for path in [path for path in self.pending if path not in snapshot]:
+            del self.pending[path]
+        return sorted(ready), sorted(deleted)
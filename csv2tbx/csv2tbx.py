@@ -1,80 +1,344 @@
 import os
+import sys
 import csv
-from datetime import datetime
-import pytz
+import argparse
+import itertools
+import sqlite3
+import time
+import unicodedata
+from datetime import datetime, timezone
 from pathlib import Path
-from xml.sax.saxutils import escape
-
-# Constants
-TBX_HEADER = """<?xml version='1.0'?>
-<!DOCTYPE martif SYSTEM "TBXcoreStructV02.dtd">
-<martif type="TBX" xml:lang="en">
-<martifHeader>
-<encodingDesc>
-<p type="XCSURI">http://www.lisa.org/fileadmin/standards/tbx/TBXXCSV02.XCS</p>
-</encodingDesc>
-</martifHeader>
-<text>
-<body>
-"""
-
-TBX_FOOTER = """</body>
-</text>
-</martif>
-"""
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.manifest import BuildManifest
+from common.metrics import METRICS, add_metrics_arguments, record_run
+from common.parallel import run_parallel
+from common.xmlserializer import (ENTRY_DEFINITION_SUFFIX, ENTRY_SUFFIX, LANGSET_SUFFIX, TBX_FOOTER, TBX_HEADER,
+                                  TIG_PREFIX, escape, generate_entry_prefix, generate_langset_prefix,
+                                  generate_tig_suffix, xml_document)
+
+# Default settings, each of which can also be given as a command line option
 LANGUAGES = {"ja_JP", "en_US", "zh_CN"}  # List up languages to process
+DEFINITION_COLUMN = "Definition"
+POS_COLUMN = "POS"
+
+# Consolidation: set CONSOLIDATED_TBX to a file name (e.g. "glossary.tbx") to merge
+# rows of all CSVs into one <termEntry> per concept instead of one TBX per CSV.
+CONSOLIDATED_TBX = None
+CONCEPT_KEY_COLUMN = None  # Column identifying a concept; None groups rows by normalized term
+CONCEPT_LANGUAGE = "en_US"  # Language whose normalized term identifies a concept
+CONCEPT_SPILL_PATH = None  # Set to a file name to keep the concept index in SQLite on disk
+
+MANIFEST_PATH = ".csv2tbx_manifest.json"  # Build manifest used to skip unchanged CSVs
+WORKERS = 1  # Number of worker processes converting files in parallel; 0 uses every CPU core
+
+DESCRIPTION = "Convert the CSV files in the current directory tree to TBX."
 
 def get_current_iso_time():
     """Returns the current UTC time in ISO 8601 format with 'Z'."""
-    return datetime.now(tz=pytz.utc).isoformat().replace("+00:00", "Z")
+    return datetime.now(tz=timezone.utc).isoformat().replace("+00:00", "Z")
 
-def convert_csv_to_tbx(csv_path, tbx_path, iso_time):
-    """Converts a CSV file to TBX format and writes the output."""
+def convert_csv_to_tbx(csv_path, tbx_path, iso_time, languages=LANGUAGES,
+                       definition_column=DEFINITION_COLUMN, pos_column=POS_COLUMN):
+    """
+    Converts a CSV file to TBX format and writes the output.
+    Rows, input and output bytes and the time taken are recorded in METRICS.
+    Returns True when written and False on error; a partly written TBX is removed.
+    """
     print(f"Processing: {csv_path}")
-    
-    with open(csv_path, newline='', encoding='utf-8') as csvfile, open(tbx_path, "w", encoding="utf-8") as tbxfile:
-        reader = csv.DictReader(csvfile)
-        tbxfile.write(TBX_HEADER)
+    try:
+        start = time.perf_counter()
+        rows = 0
         
-        for row in reader:
-            definition = escape(row.get("Definition", ""))
-            pos = escape(row.get("POS", ""))
-            
-            tbxfile.write(f"""
-<termEntry>
-<descrip type="Creator">{Path(csv_path).name}</descrip>
-<descrip type="xDate_CreateTime">{iso_time}</descrip>
-<descrip type="definition">{definition}</descrip>
-""")
-            
-            for lang, term in row.items():
-                if lang in LANGUAGES and term:
-                    tbxfile.write(f"""
-<langSet xml:lang="{escape(lang)}">
-<tig>
-<term>{escape(term)}</term>
-<termNote type="partOfSpeech">{escape(pos)}</termNote>
-</tig>
-</langSet>
-""")
+        with open(csv_path, newline='', encoding='utf-8') as csvfile, xml_document(tbx_path, TBX_HEADER, TBX_FOOTER) as write:
+            reader = csv.DictReader(csvfile)
+        
+            entry_prefix = generate_entry_prefix(Path(csv_path).name, iso_time)
+            term_prefixes = {lang: generate_langset_prefix(lang) + TIG_PREFIX for lang in languages}
+        
+            for row in reader:
+                rows += 1
+                definition = escape(row.get(definition_column, ""))
+                # POS has always been escaped twice in this output; kept for byte-identical files
+                term_suffix = generate_tig_suffix(escape(escape(row.get(pos_column, "")))) + LANGSET_SUFFIX
             
-            tbxfile.write("</termEntry>\n")
+                lang_sets = "".join([term_prefixes[lang] + escape(term) + term_suffix
+                                     for lang, term in row.items() if lang in languages and term])
+                write(entry_prefix + definition + ENTRY_DEFINITION_SUFFIX + lang_sets + ENTRY_SUFFIX)
         
-        tbxfile.write(TBX_FOOTER)
-    
-    print(f"Finished writing: {tbx_path}\n")
+        elapsed = time.perf_counter() - start
+        METRICS.add_time("convert", elapsed)
+        METRICS.record_file(csv_path, rows=rows, input_bytes=os.path.getsize(csv_path),
+                            output_bytes=os.path.getsize(tbx_path), seconds=round(elapsed, 6))
+        print(f"Finished writing: {tbx_path}\n")
+        return True
+    except Exception as e:
+        print(f"Error processing {csv_path}: {e}")
+        if os.path.exists(tbx_path):
+            os.remove(tbx_path)
+        return False
+
+def normalize_term(term):
+    """Normalizes a term for concept matching: NFKC, case-folded, collapsed whitespace."""
+    return " ".join(unicodedata.normalize("NFKC", term).casefold().split())
+
+def get_concept_key(row, key_column, concept_language):
+    """Returns the key that identifies the concept of a CSV row, or '' if it has none."""
+    if key_column:
+        return (row.get(key_column) or "").strip()
+    return normalize_term(row.get(concept_language) or "")
+
+def iter_concept_rows(csv_path, key_column, concept_language, languages=LANGUAGES,
+                      definition_column=DEFINITION_COLUMN, pos_column=POS_COLUMN):
+    """Yields (concept_key, creator, definition, pos, terms) for every row of a CSV."""
+    creator = Path(csv_path).name
+    with open(csv_path, newline='', encoding='utf-8') as csvfile:
+        for row in csv.DictReader(csvfile):
+            terms = [(lang, term) for lang, term in row.items() if lang in languages and term]
+            yield (get_concept_key(row, key_column, concept_language), creator,
+                   row.get(definition_column) or "", row.get(pos_column) or "", terms)
+
+def add_csv_files(csv_paths, add_rows):
+    """
+    Calls add_rows(csv_path) for every CSV to add its rows to a concept index;
+    add_rows returns the number of rows and leaves the index unchanged if it raises.
+    A CSV that cannot be read is reported and left out of the index.
+    Returns the CSVs that were added.
+    """
+    added = []
+    for csv_path in csv_paths:
+        print(f"Processing: {csv_path}")
+        try:
+            rows = add_rows(csv_path)
+        except Exception as e:
+            print(f"Error processing {csv_path}: {e}")
+            continue
+        METRICS.record_file(csv_path, rows=rows, input_bytes=os.path.getsize(csv_path))
+        added.append(csv_path)
+    return added
+
+def build_concepts_in_memory(csv_paths, read_rows):
+    """
+    Groups the rows that read_rows(csv_path) yields for every CSV into concepts
+    with a dict index. Returns the (creator, definition, {lang: {term: pos}})
+    tuples in first-seen order and the CSVs that were added.
+    """
+    concepts = {}
+    seq = itertools.count()
+
+    def add_rows(csv_path):
+        # Read the whole CSV first so a CSV that fails halfway adds nothing
+        rows = list(read_rows(csv_path))
+        for key, creator, definition, pos, terms in rows:
+            # Rows without a key cannot be matched and stay separate concepts
+            concept = concepts.setdefault(key or next(seq), [creator, definition, {}])
+            if not concept[1]:
+                concept[1] = definition
+            for lang, term in terms:
+                concept[2].setdefault(lang, {}).setdefault(term, pos)
+        return len(rows)
+
+    added = add_csv_files(csv_paths, add_rows)
+    return (tuple(concept) for concept in concepts.values()), added
+
+def build_concepts_on_disk(csv_paths, read_rows, conn):
+    """
+    Groups the rows that read_rows(csv_path) yields for every CSV into concepts
+    with an SQLite index in conn, for glossaries too large to index in memory.
+    Returns the same tuples as build_concepts_in_memory, as a generator holding
+    only one concept in memory at a time, and the CSVs that were added.
+    """
+    # Unlike journal_mode OFF, an in-memory journal lets a failed CSV be rolled back
+    conn.execute("PRAGMA journal_mode = MEMORY")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("DROP TABLE IF EXISTS concepts")
+    conn.execute("DROP TABLE IF EXISTS terms")
+    conn.execute("CREATE TABLE concepts (key TEXT PRIMARY KEY, seq INTEGER NOT NULL, creator TEXT, definition TEXT)")
+    conn.execute("CREATE TABLE terms (seq INTEGER NOT NULL, lang TEXT, term TEXT, pos TEXT, UNIQUE (seq, lang, term))")
+    conn.commit()
+    seq = itertools.count()
 
-def process_csv_files():
-    """Finds all CSV files in the current directory and its subdirectories, then converts them to TBX."""
+    def add_rows(csv_path):
+        rows = 0
+        try:
+            for key, creator, definition, pos, terms in read_rows(csv_path):
+                row_seq = next(seq)
+                key = key or f"\0{row_seq}"
+                conn.execute("INSERT INTO concepts VALUES (?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET definition = excluded.definition "
+                             "WHERE concepts.definition = ''", (key, row_seq, creator, definition))
+                concept_seq = conn.execute("SELECT seq FROM concepts WHERE key = ?", (key,)).fetchone()[0]
+                conn.executemany("INSERT OR IGNORE INTO terms VALUES (?, ?, ?, ?)",
+                                 [(concept_seq, lang, term, pos) for lang, term in terms])
+                rows += 1
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+        return rows
+
+    added = add_csv_files(csv_paths, add_rows)
+
+    def iter_concepts():
+        query = ("SELECT c.seq, c.creator, c.definition, t.lang, t.term, t.pos FROM concepts c "
+                 "LEFT JOIN terms t ON t.seq = c.seq ORDER BY c.seq, t.rowid")
+        for _, group in itertools.groupby(conn.execute(query), key=lambda result: result[0]):
+            lang_terms = {}
+            for _, creator, definition, lang, term, pos in group:
+                if lang is not None:
+                    lang_terms.setdefault(lang, {})[term] = pos
+            yield creator, definition, lang_terms
+
+    return iter_concepts(), added
+
+def write_consolidated_tbx(concepts, tbx_path, iso_time):
+    """
+    Writes one <termEntry> per concept. Each language gets a single <langSet>
+    holding one <tig> per distinct term; the Creator is the CSV that first
+    introduced the concept.
+    The TBX is written to a temporary file that replaces tbx_path only when
+    complete, so a failure leaves the previous TBX in place.
+    """
+    count = 0
+    langset_prefixes = {}
+    temp_path = tbx_path + ".tmp"
+    try:
+        with xml_document(temp_path, TBX_HEADER, TBX_FOOTER) as write:
+            for creator, definition, lang_terms in concepts:
+                parts = [generate_entry_prefix(escape(creator), iso_time), escape(definition), ENTRY_DEFINITION_SUFFIX]
+                for lang, terms in lang_terms.items():
+                    if lang not in langset_prefixes:
+                        langset_prefixes[lang] = generate_langset_prefix(lang)
+                    parts.append(langset_prefixes[lang])
+                    for term, pos in terms.items():
+                        parts += [TIG_PREFIX, escape(term), generate_tig_suffix(escape(pos))]
+                    parts.append(LANGSET_SUFFIX)
+                parts.append(ENTRY_SUFFIX)
+                write("".join(parts))
+                count += 1
+        os.replace(temp_path, tbx_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    print(f"Finished writing: {tbx_path} ({count} concepts)\n")
+
+def consolidate_csv_files(csv_paths, tbx_path, iso_time, key_column=None, concept_language="en_US", spill_path=None,
+                          languages=LANGUAGES, definition_column=DEFINITION_COLUMN, pos_column=POS_COLUMN):
+    """
+    Merges rows of all CSV files into one TBX with one <termEntry> per concept.
+    A CSV that cannot be read is reported and left out of the TBX.
+    Returns the CSVs that were added.
+    """
+    def read_rows(csv_path):
+        return iter_concept_rows(csv_path, key_column, concept_language, languages, definition_column, pos_column)
+
+    with METRICS.stage("consolidate"):
+        if spill_path:
+            conn = sqlite3.connect(spill_path)
+            try:
+                concepts, added = build_concepts_on_disk(csv_paths, read_rows, conn)
+                write_consolidated_tbx(concepts, tbx_path, iso_time)
+            finally:
+                conn.close()
+        else:
+            concepts, added = build_concepts_in_memory(csv_paths, read_rows)
+            write_consolidated_tbx(concepts, tbx_path, iso_time)
+    METRICS.count("output_bytes", os.path.getsize(tbx_path))
+    return added
+
+def find_csv_files():
+    """Return the CSV files in the current directory and its subdirectories, in a stable order."""
+    csv_paths = []
+    for root, dirs, files in os.walk("."):
+        dirs.sort()
+        for file in sorted(files):
+            if file.endswith(".csv"):
+                csv_paths.append(os.path.join(root, file))
+    return csv_paths
+
+def process_csv_files(force=False, languages=LANGUAGES, definition_column=DEFINITION_COLUMN, pos_column=POS_COLUMN,
+                      consolidated_tbx=CONSOLIDATED_TBX, concept_key_column=CONCEPT_KEY_COLUMN,
+                      concept_language=CONCEPT_LANGUAGE, concept_spill_path=CONCEPT_SPILL_PATH, workers=WORKERS,
+                      csv_paths=None):
+    """
+    Finds all CSV files in the current directory and its subdirectories, then converts them to TBX.
+    CSVs unchanged since the last run are skipped unless force is True.
+    csv_paths limits the run to these CSVs instead of searching the tree, e.g. the
+    files a watcher saw change; the consolidated TBX is always built from every CSV.
+    """
     iso_time = get_current_iso_time()
+    if csv_paths is None or consolidated_tbx:
+        csv_paths = find_csv_files()
     
-    for root, _, files in os.walk("."):
-        for file in files:
-            if file.endswith(".csv"):
-                csv_path = os.path.join(root, file)
-                tbx_path = os.path.splitext(csv_path)[0] + ".tbx"
-                convert_csv_to_tbx(csv_path, tbx_path, iso_time)
+    settings = {"languages": sorted(languages), "definition_column": definition_column, "pos_column": pos_column,
+                "consolidated_tbx": consolidated_tbx, "concept_key_column": concept_key_column,
+                "concept_language": concept_language}
+    manifest = BuildManifest(MANIFEST_PATH, settings, force=force)
+    
+    if consolidated_tbx:
+        # The consolidated TBX depends on every CSV: rebuild it when any CSV changed or was deleted
+        changed = [csv_path for csv_path in csv_paths if not manifest.is_up_to_date(csv_path, [consolidated_tbx])]
+        deleted = manifest.prune(delete_outputs=False)
+        if not changed and not deleted:
+            print(f"Up to date: {consolidated_tbx}")
+        else:
+            # CSVs that failed are not recorded, so they are retried next time
+            added = consolidate_csv_files(csv_paths, consolidated_tbx, iso_time, concept_key_column, concept_language,
+                                          concept_spill_path, languages, definition_column, pos_column)
+            for csv_path in added:
+                manifest.record(csv_path, [consolidated_tbx])
+        manifest.save()
+        return
+    
+    jobs = []
+    for csv_path in csv_paths:
+        tbx_path = os.path.splitext(csv_path)[0] + ".tbx"
+        if not manifest.is_up_to_date(csv_path, [tbx_path]):
+            jobs.append((csv_path, (csv_path, tbx_path, iso_time, languages, definition_column, pos_column)))
+    manifest.prune()
+    if len(jobs) < len(csv_paths):
+        print(f"Up to date: {len(csv_paths) - len(jobs)} files\n")
+    
+    if workers != 1:
+        statuses = run_parallel(convert_csv_to_tbx, jobs, workers)
+    else:
+        statuses = [convert_csv_to_tbx(*job_args) for _, job_args in jobs]
+    
+    for (csv_path, (_, tbx_path, *_)), status in zip(jobs, statuses):
+        if status:
+            manifest.record(csv_path, [tbx_path])
+    manifest.save()
+
+def add_arguments(parser):
+    """Add the options of this tool to an argument parser."""
+    parser.add_argument("--force", action="store_true", help="convert every CSV, even if it is unchanged since the last run")
+    parser.add_argument("--languages", nargs="+", default=sorted(LANGUAGES), metavar="LANG",
+                        help="headers of the language columns to convert (default: %(default)s)")
+    parser.add_argument("--definition-column", default=DEFINITION_COLUMN, help="header of the definition column (default: %(default)s)")
+    parser.add_argument("--pos-column", default=POS_COLUMN, help="header of the part of speech column (default: %(default)s)")
+    parser.add_argument("--consolidated-tbx", default=CONSOLIDATED_TBX, metavar="PATH",
+                        help="merge the rows of all CSVs into one TBX at PATH with one <termEntry> per concept")
+    parser.add_argument("--concept-key-column", default=CONCEPT_KEY_COLUMN,
+                        help="with --consolidated-tbx, column identifying a concept (default: the normalized term)")
+    parser.add_argument("--concept-language", default=CONCEPT_LANGUAGE,
+                        help="with --consolidated-tbx, language whose normalized term identifies a concept (default: %(default)s)")
+    parser.add_argument("--concept-spill-path", default=CONCEPT_SPILL_PATH, metavar="PATH",
+                        help="with --consolidated-tbx, keep the concept index in an SQLite file at PATH")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="convert files in N processes in parallel (0 = one per CPU core)")
+    add_metrics_arguments(parser, "csv2tbx")
+
+def run(args, paths=None):
+    """Run the tool with parsed options; paths limits the run to these CSVs (see process_csv_files)."""
+    with record_run("csv2tbx", args.metrics, args.profile):
+        process_csv_files(args.force, set(args.languages), args.definition_column, args.pos_column,
+                          args.consolidated_tbx, args.concept_key_column, args.concept_language,
+                          args.concept_spill_path, args.workers, paths)
+
+def main():
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    add_arguments(parser)
+    run(parser.parse_args())
 
 if __name__ == "__main__":
-    process_csv_files()
\ No newline at end of file
+    main()
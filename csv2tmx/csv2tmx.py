@@ -1,77 +1,324 @@
 import os
+import sys
 import csv
+import argparse
+import hashlib
+import itertools
+import sqlite3
+import tempfile
+import time
+from contextlib import ExitStack
 from datetime import datetime
-from xml.sax.saxutils import escape
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.manifest import BuildManifest
+from common.metrics import METRICS, add_metrics_arguments, record_run
+from common.parallel import run_parallel
+from common.xmlserializer import (TU_FOOTER, TUV_SUFFIX, escape, generate_tmx_footer, generate_tmx_header,
+                                  generate_tu_head, generate_tuv_prefix, xml_document)
+
+MANIFEST_PATH = ".csv2tmx_manifest.json"  # Build manifest used to skip unchanged CSVs
+
+# Default settings, each of which can also be given as a command line option
+# Specify key, source, and target language headers
+KEY_ID = "key"
+SOURCE_LANG = "ja_JP"
+TARGET_LANGS = ["en_US"]
+# Write one TMX per target language instead of one multilingual TMX
+SPLIT_TARGETS = False
+# Set to a file name (e.g. "merged.tmx") to write one deduplicated TMX for all CSVs
+MERGED_TMX_PATH = None
+# Which duplicate to keep when merging: "first" or "last"
+MERGE_KEEP = "first"
+# Number of worker processes converting files in parallel; 0 uses every CPU core
+WORKERS = 1
+
+DESCRIPTION = "Convert the CSV files in the current directory tree to TMX."
 
 def get_current_datetime():
     return datetime.now().strftime("%Y%m%dT%H%M%S")
 
-def generate_tmx_header():
-    return f"""<?xml version="1.0" encoding="UTF-8"?>
-<tmx version="1.4">
-  <header srclang="en_US" datatype="plaintext"/>
-  <body>"""
+def iter_segments(rows, key_id, source_lang, target_langs):
+    """
+    Yield (key, source_text, prev_source, next_source, target_texts) per row,
+    with every field already XML-escaped. target_texts lists the escaped text
+    of each target language in target_langs order.
+    Rows are read through a sliding window, so only the current row is held
+    in memory; each source text is escaped once and reused as its neighbours'
+    context.
+    """
+    key = None
+    prev_source = ""
+    for row in rows:
+        next_source = escape(row.get(source_lang, "N/A"))
+        if key is not None:
+            yield key, source_text, prev_source, next_source, target_texts
+            prev_source = source_text
+        key = escape(row.get(key_id, "N/A"))
+        source_text = next_source
+        target_texts = [escape(row.get(lang, "N/A")) for lang in target_langs]
+    if key is not None:
+        yield key, source_text, prev_source, "", target_texts
 
-def generate_tmx_footer():
-    return """
-  </body>
-</tmx>"""
-
-def process_csv_file(file_path, tmx_file_path, key_id, source_lang, target_lang):
+def write_tmx_files(file_path, outputs, key_id, source_lang, current_datetime=None):
+    """
+    Convert one CSV file into one or more TMX files in a single pass.
+    outputs maps each TMX file path to the list of target languages it holds.
+    The context props and source <tuv> are rendered once per row and shared by
+    every output, so adding target languages never re-reads the CSV.
+    current_datetime defaults to the time the file is converted.
+    Rows, input and output bytes and the time taken are recorded in METRICS.
+    Returns True when written, None when the CSV is empty and False on error.
+    """
+    start = time.perf_counter()
     try:
         with open(file_path, newline='', encoding='utf-8') as csvfile:
             reader = csv.DictReader(csvfile)
-            rows = list(reader)
-            total_rows = len(rows)
+            target_langs = list(dict.fromkeys(lang for langs in outputs.values() for lang in langs))
+            segments = iter_segments(reader, key_id, source_lang, target_langs)
+            first_segment = next(segments, None)
             
-            if total_rows == 0:
+            if first_segment is None:
                 print(f"Skipping empty file: {file_path}")
-                return
+                return None
             
-            current_datetime = get_current_datetime()
+            current_datetime = current_datetime or get_current_datetime()
+            source_tuv_prefix = generate_tuv_prefix(source_lang, current_datetime)
+            target_tuv_prefixes = [generate_tuv_prefix(lang, current_datetime) for lang in target_langs]
             
-            with open(tmx_file_path, "w", encoding="utf-8") as tmxfile:
-                tmxfile.write(generate_tmx_header(source_lang))
+            with ExitStack() as stack:
+                writers = []
+                for tmx_file_path, langs in outputs.items():
+                    write = stack.enter_context(xml_document(tmx_file_path, generate_tmx_header(source_lang),
+                                                             generate_tmx_footer()))
+                    # (index into target_texts, <tuv> prefix) for each target of this file
+                    targets = [(target_langs.index(lang), target_tuv_prefixes[target_langs.index(lang)]) for lang in langs]
+                    writers.append((write, targets))
                 
-                for i, row in enumerate(rows):
-                    key = escape(row.get(key_id, "N/A"))
-                    source_text = escape(row.get(source_lang, "N/A"))
-                    target_text = escape(row.get(target_lang, "N/A"))
-                    prev_source = escape(rows[i - 1].get(source_lang, "N/A")) if i > 0 else ""
-                    next_source = escape(rows[i + 1].get(source_lang, "N/A")) if i < total_rows - 1 else ""
+                rows = 0
+                for key, source_text, prev_source, next_source, target_texts in itertools.chain([first_segment], segments):
+                    rows += 1
+                    tu_head = generate_tu_head(key, prev_source, next_source, source_tuv_prefix, source_text)
                     
-                    tmxfile.write(f"""
-  <tu>
-    <prop type="x-segment-id">{key}</prop>
-    <prop type="x-previous-source-text">{prev_source}</prop>
-    <prop type="x-next-source-text">{next_source}</prop>
-    <tuv xml:lang="{source_lang}" creationdate="{current_datetime}" lastusagedate="{current_datetime}">
-      <seg>{source_text}</seg>
-    </tuv>
-    <tuv xml:lang="{target_lang}" creationdate="{current_datetime}" lastusagedate="{current_datetime}">
-      <seg>{target_text}</seg>
-    </tuv>
-  </tu>""")
-                
-                tmxfile.write(generate_tmx_footer())
+                    for write, targets in writers:
+                        write(tu_head + "".join([prefix + target_texts[i] + TUV_SUFFIX for i, prefix in targets]) + TU_FOOTER)
                 
-            print(f"Finished writing: {tmx_file_path}")
+            for tmx_file_path in outputs:
+                print(f"Finished writing: {tmx_file_path}")
+            elapsed = time.perf_counter() - start
+            METRICS.add_time("convert", elapsed)
+            METRICS.record_file(file_path, rows=rows, input_bytes=os.path.getsize(file_path),
+                                output_bytes=sum(os.path.getsize(path) for path in outputs),
+                                seconds=round(elapsed, 6))
+            return True
     except Exception as e:
         print(f"Error processing {file_path}: {e}")
+        return False
 
-def main():
-    # Specify key, source, and target language headers
-    key_id = "key"
-    source_lang = "ja_JP"
-    target_lang = "en_US"
+def process_csv_file(file_path, tmx_file_path, key_id, source_lang, target_lang, current_datetime=None):
+    return write_tmx_files(file_path, {tmx_file_path: [target_lang]}, key_id, source_lang, current_datetime)
+
+def get_tmx_outputs(tmx_file_path, target_langs, split_targets=False):
+    """Map each TMX file written for tmx_file_path to the target languages it holds."""
+    if split_targets:
+        base_path = os.path.splitext(tmx_file_path)[0]
+        return {f"{base_path}_{lang}.tmx": [lang] for lang in target_langs}
+    return {tmx_file_path: list(target_langs)}
+
+def process_csv_file_multi_target(file_path, tmx_file_path, key_id, source_lang, target_langs, split_targets=False,
+                                  current_datetime=None):
+    """
+    Convert one CSV file for several target languages in a single pass.
+    By default one multilingual TMX is written with a <tuv> per target language.
+    With split_targets=True one TMX per target is written next to tmx_file_path,
+    named <name>_<target_lang>.tmx.
+    """
+    outputs = get_tmx_outputs(tmx_file_path, target_langs, split_targets)
+    return write_tmx_files(file_path, outputs, key_id, source_lang, current_datetime)
+
+def segment_hash(source_text, prev_source, next_source, target_langs, target_texts):
+    """Return the dedup key of a translation unit: a digest of its source, targets and context."""
+    fields = [source_text, prev_source, next_source]
+    for lang, text in zip(target_langs, target_texts):
+        fields += [lang, text]
+    return hashlib.sha1("\0".join(fields).encode("utf-8")).digest()
+
+def merge_csv_files(file_paths, merged_tmx_path, key_id, source_lang, target_langs, keep="first", index_path=None):
+    """
+    Convert many CSV files into one merged TMX, dropping duplicate translation units.
+    Units are duplicates when their source, target and context (previous/next source)
+    texts match; the segment id is not part of the key.
+    keep="first" keeps the earliest unit of each duplicate group, keep="last" the latest.
+    Rendered units are staged in an SQLite index on disk (index_path, or a temporary
+    file next to merged_tmx_path) so the merge is not limited by RAM.
+    Indexing and writing are timed as the "index" and "write" stages of METRICS.
+    A CSV that cannot be read is reported and its units are rolled back.
+    Returns the CSVs whose units were merged.
+    """
+    if keep not in ("first", "last"):
+        raise ValueError(f"keep must be 'first' or 'last', not {keep!r}")
     
-    for root, _, files in os.walk("."):
-        for file in files:
+    if index_path is None:
+        fd, temp_index_path = tempfile.mkstemp(suffix=".sqlite", dir=os.path.dirname(os.path.abspath(merged_tmx_path)))
+        os.close(fd)
+    else:
+        temp_index_path = None
+    
+    conflict_action = "NOTHING" if keep == "first" else "UPDATE SET seq = excluded.seq, body = excluded.body"
+    insert_sql = f"INSERT INTO tu (hash, seq, body) VALUES (?, ?, ?) ON CONFLICT(hash) DO {conflict_action}"
+    
+    conn = sqlite3.connect(temp_index_path or index_path)
+    try:
+        # Unlike journal_mode OFF, an in-memory journal lets a failed CSV be rolled back
+        conn.execute("PRAGMA journal_mode = MEMORY")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("DROP TABLE IF EXISTS tu")
+        conn.execute("CREATE TABLE tu (hash BLOB PRIMARY KEY, seq INTEGER NOT NULL, body TEXT NOT NULL)")
+        current_datetime = get_current_datetime()
+        source_tuv_prefix = generate_tuv_prefix(source_lang, current_datetime)
+        target_tuv_prefixes = [generate_tuv_prefix(lang, current_datetime) for lang in target_langs]
+        total_units = 0
+        merged_paths = []
+        
+        for file_path in file_paths:
+            print(f"Processing: {file_path}")
+            start = time.perf_counter()
+            try:
+                with open(file_path, newline='', encoding='utf-8') as csvfile:
+                    segments = iter_segments(csv.DictReader(csvfile), key_id, source_lang, target_langs)
+                    file_units = 0
+                    for key, source_text, prev_source, next_source, target_texts in segments:
+                        body = (generate_tu_head(key, prev_source, next_source, source_tuv_prefix, source_text)
+                                + "".join([prefix + text + TUV_SUFFIX for prefix, text in zip(target_tuv_prefixes, target_texts)])
+                                + TU_FOOTER)
+                        conn.execute(insert_sql, (segment_hash(source_text, prev_source, next_source, target_langs, target_texts),
+                                                  total_units + file_units, body))
+                        file_units += 1
+                conn.commit()
+                total_units += file_units
+            except Exception as e:
+                conn.rollback()
+                print(f"Error processing {file_path}: {e}")
+                continue
+            finally:
+                METRICS.add_time("index", time.perf_counter() - start)
+            METRICS.record_file(file_path, rows=file_units, input_bytes=os.path.getsize(file_path),
+                                seconds=round(time.perf_counter() - start, 6))
+            merged_paths.append(file_path)
+        
+        with METRICS.stage("write"):
+            conn.execute("CREATE INDEX tu_seq ON tu (seq)")
+            unique_units = 0
+            with xml_document(merged_tmx_path, generate_tmx_header(source_lang), generate_tmx_footer()) as write:
+                for (body,) in conn.execute("SELECT body FROM tu ORDER BY seq"):
+                    write(body)
+                    unique_units += 1
+        METRICS.count("output_bytes", os.path.getsize(merged_tmx_path))
+    finally:
+        conn.close()
+        if temp_index_path is not None:
+            os.remove(temp_index_path)
+    
+    duplicates = total_units - unique_units
+    METRICS.count("duplicates", duplicates)
+    print(f"Finished writing: {merged_tmx_path} ({unique_units} units, {duplicates} duplicates removed)")
+    return merged_paths
+
+def find_csv_files():
+    """Return the CSV files in the current directory and its subdirectories, in a stable order."""
+    csv_paths = []
+    for root, dirs, files in os.walk("."):
+        dirs.sort()
+        for file in sorted(files):
             if file.endswith(".csv"):
-                file_path = os.path.join(root, file)
-                tmx_file_path = os.path.join(root, os.path.splitext(file)[0] + ".tmx")
-                print(f"Processing: {file_path}")
-                process_csv_file(file_path, tmx_file_path, key_id, source_lang, target_lang)
+                csv_paths.append(os.path.join(root, file))
+    return csv_paths
+
+def process_csv_files(force=False, key_id=KEY_ID, source_lang=SOURCE_LANG, target_langs=TARGET_LANGS,
+                      split_targets=SPLIT_TARGETS, merged_tmx_path=MERGED_TMX_PATH, merge_keep=MERGE_KEEP,
+                      workers=WORKERS, csv_paths=None):
+    """
+    Finds all CSV files in the current directory and its subdirectories, then converts them to TMX.
+    CSVs unchanged since the last run are skipped unless force is True.
+    csv_paths limits the run to these CSVs instead of searching the tree, e.g. the
+    files a watcher saw change; the merged TMX is always built from every CSV.
+    """
+    if csv_paths is None or merged_tmx_path:
+        csv_paths = find_csv_files()
+    
+    # CSVs and settings unchanged since the last run are skipped
+    settings = {"key_id": key_id, "source_lang": source_lang, "target_langs": target_langs,
+                "split_targets": split_targets, "merged_tmx_path": merged_tmx_path, "merge_keep": merge_keep}
+    manifest = BuildManifest(MANIFEST_PATH, settings, force=force)
+    
+    if merged_tmx_path:
+        # The merged TMX depends on every CSV: rebuild it when any CSV changed or was deleted
+        changed = [file_path for file_path in csv_paths if not manifest.is_up_to_date(file_path, [merged_tmx_path])]
+        deleted = manifest.prune(delete_outputs=False)
+        if not changed and not deleted:
+            print(f"Up to date: {merged_tmx_path}")
+        else:
+            # CSVs that failed are not recorded, so they are retried next time
+            merged_paths = merge_csv_files(csv_paths, merged_tmx_path, key_id, source_lang, target_langs, merge_keep)
+            for file_path in merged_paths:
+                manifest.record(file_path, [merged_tmx_path])
+        manifest.save()
+        return
+    
+    # One timestamp for the whole run keeps parallel and sequential output identical
+    current_datetime = get_current_datetime()
+    
+    jobs = []
+    for file_path in csv_paths:
+        tmx_file_path = os.path.splitext(file_path)[0] + ".tmx"
+        if manifest.is_up_to_date(file_path, get_tmx_outputs(tmx_file_path, target_langs, split_targets)):
+            continue
+        jobs.append((file_path, (file_path, tmx_file_path, key_id, source_lang,
+                                 target_langs, split_targets, current_datetime)))
+    manifest.prune()
+    if len(jobs) < len(csv_paths):
+        print(f"Up to date: {len(csv_paths) - len(jobs)} files")
+    
+    if workers != 1:
+        statuses = run_parallel(process_csv_file_multi_target, jobs, workers)
+    else:
+        statuses = []
+        for file_path, job_args in jobs:
+            print(f"Processing: {file_path}")
+            statuses.append(process_csv_file_multi_target(*job_args))
+    
+    for (file_path, job_args), status in zip(jobs, statuses):
+        if status:
+            manifest.record(file_path, get_tmx_outputs(job_args[1], target_langs, split_targets))
+    manifest.save()
+
+def add_arguments(parser):
+    """Add the options of this tool to an argument parser."""
+    parser.add_argument("--force", action="store_true", help="convert every CSV, even if it is unchanged since the last run")
+    parser.add_argument("--key-id", default=KEY_ID, help="header of the key column (default: %(default)s)")
+    parser.add_argument("--source-lang", default=SOURCE_LANG, help="header of the source language column (default: %(default)s)")
+    parser.add_argument("--target-langs", nargs="+", default=TARGET_LANGS, metavar="LANG",
+                        help="headers of the target language columns (default: %(default)s)")
+    parser.add_argument("--split-targets", action="store_true", default=SPLIT_TARGETS,
+                        help="write one TMX per target language instead of one multilingual TMX")
+    parser.add_argument("--merged-tmx", default=MERGED_TMX_PATH, metavar="PATH",
+                        help="write one deduplicated TMX for all CSVs to PATH")
+    parser.add_argument("--merge-keep", choices=("first", "last"), default=MERGE_KEEP,
+                        help="duplicate to keep with --merged-tmx (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="convert files in N processes in parallel (0 = one per CPU core)")
+    add_metrics_arguments(parser, "csv2tmx")
+
+def run(args, paths=None):
+    """Run the tool with parsed options; paths limits the run to these CSVs (see process_csv_files)."""
+    with record_run("csv2tmx", args.metrics, args.profile):
+        process_csv_files(args.force, args.key_id, args.source_lang, args.target_langs, args.split_targets,
+                          args.merged_tmx, args.merge_keep, args.workers, paths)
+
+def main():
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    add_arguments(parser)
+    run(parser.parse_args())
 
 if __name__ == "__main__":
     main()
@@ -1,23 +1,247 @@
 import os
-import pandas as pd
-from bs4 import BeautifulSoup
+import sys
+import argparse
 import csv
 import html
-from typing import List, Optional, Dict
+from html.parser import HTMLParser
+from itertools import chain
+from typing import Iterator, List, Optional, Dict, Tuple
 import logging
+import time
 from pathlib import Path
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.manifest import BuildManifest
+from common.metrics import METRICS, add_metrics_arguments, record_run
+from common.parallel import run_parallel
+
 # Set up logging
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
+    format=LOG_FORMAT
 )
 
+# BeautifulSoup, openpyxl and pandas are imported where they are used, so
+# runs with nothing to convert do not pay for loading them.
+
+# Tables are selected like the CSS selector "div.<TABLE_WRAP_CLASS> div.<TABLE_BLOCK_CLASS> table"
+TABLE_WRAP_CLASS = 'table-wrap'
+TABLE_BLOCK_CLASS = 'table-block'
+
+DESCRIPTION = "Convert HTML tables in the current directory tree to Excel."
+READ_CHUNK_SIZE = 1 << 20
+# Default colspan limit: the number of columns of an Excel sheet
+MAX_COLUMNS = 16384
+
+class _TableCapture:
+    """Raw source and header state of one selected table while it is being parsed."""
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.depth = 0          # Tables nested inside this one that are still open
+        self.rows = 0           # Rows of this table (not of nested tables) seen so far
+        self.row_open = False   # Whether a row of this table has started and not ended yet
+        self.matched = False
+        self.dropped = False
+        self.done = False
+
+class StreamingTableExtractor(HTMLParser):
+    """
+    Event-driven extractor for the tables of a page that would be selected by
+    "div.<wrap_class> div.<block_class> table" and contain header_indicator.
+
+    Only the source of selected tables is kept; everything else is dropped
+    as it is parsed. Cell text is checked for header_indicator as each cell
+    closes, and a table is parsed into a BeautifulSoup tree only once it has
+    ended and matched, so the grid extraction sees the same tree as with a
+    full parse. With header_rows set, a table without a match in its first
+    header_rows rows is dropped at once instead of being kept until its end.
+
+    End tags of cells and rows may be left out in HTML: a cell also ends when
+    the next cell or row of its table starts or the table ends, and a row
+    when the next row starts.
+    """
+
+    def __init__(self, header_indicator: str, header_rows: Optional[int] = None,
+                 wrap_class: str = TABLE_WRAP_CLASS, block_class: str = TABLE_BLOCK_CLASS):
+        super().__init__(convert_charrefs=False)
+        self.header_indicator = header_indicator
+        self.header_rows = header_rows
+        self.wrap_class = wrap_class
+        self.block_class = block_class
+        self._divs = []          # (inside table-wrap, inside table-block of a table-wrap) per open div
+        self._captures: List[_TableCapture] = []   # Selected tables that are still open
+        self._pending: List[_TableCapture] = []    # Selected tables in document order, not yet yielded
+        self._tables = 0                           # Open tables, selected or not
+        self._cells: List[Tuple[int, List[str]]] = []  # (table level, text) of the open td/th cells
+        self._text: List[str] = []                 # Pieces of the current text node
+
+    def iter_tables(self, html_file: Path) -> Iterator:
+        """Parse html_file in chunks and yield each matching table as a BeautifulSoup tag."""
+        with open(html_file, "r", encoding="utf-8") as file:
+            for chunk in iter(lambda: file.read(READ_CHUNK_SIZE), ""):
+                self.feed(chunk)
+                yield from self._pop_tables()
+        self.close()
+        self._flush_text()
+        self._close_cells(0)
+        for capture in self._captures:
+            self._end_capture(capture)
+        self._captures.clear()
+        yield from self._pop_tables()
+
+    def _pop_tables(self) -> Iterator:
+        """Yield finished tables in document order, parsing each one into a tree."""
+        from bs4 import BeautifulSoup
+
+        while self._pending and self._pending[0].done:
+            capture = self._pending.pop(0)
+            if capture.matched:
+                yield BeautifulSoup(''.join(capture.parts), "html.parser").table
+
+    def _end_capture(self, capture: _TableCapture) -> None:
+        capture.done = True
+        if not capture.matched:
+            capture.parts = []
+
+    def _emit(self, raw: str) -> None:
+        """Append raw source to every open selected table."""
+        for capture in self._captures:
+            if not capture.dropped:
+                capture.parts.append(raw)
+
+    def _flush_text(self) -> None:
+        """End the current text node and add its stripped text to the open cells."""
+        if not self._text:
+            return
+        text = html.unescape(''.join(self._text)).strip()
+        self._text = []
+        if text:
+            for _, cell in self._cells:
+                cell.append(text)
+
+    def _close_cells(self, level: int) -> None:
+        """Close the open cells of tables at level or deeper, checking their text for header_indicator."""
+        while self._cells and self._cells[-1][0] >= level:
+            text = ''.join(self._cells.pop()[1])
+            if self.header_indicator in html.unescape(text):
+                for capture in self._captures:
+                    capture.matched = not capture.dropped
+
+    def _end_row(self) -> None:
+        """End the open row of the innermost selected table and apply header_rows to it."""
+        for capture in self._captures:
+            if capture.depth or not capture.row_open:
+                continue
+            capture.row_open = False
+            if self.header_rows is not None and not capture.matched and not capture.dropped:
+                capture.rows += 1
+                if capture.rows >= self.header_rows:
+                    capture.dropped = True
+                    capture.parts = []
+
+    def handle_starttag(self, tag, attrs):
+        self._flush_text()
+        if tag == 'div':
+            classes = (dict(attrs).get('class') or '').split()
+            in_wrap, in_block = self._divs[-1] if self._divs else (False, False)
+            self._divs.append((in_wrap or self.wrap_class in classes,
+                               in_block or (in_wrap and self.block_class in classes)))
+        elif tag == 'table':
+            self._tables += 1
+            for capture in self._captures:
+                capture.depth += 1
+            if self._divs and self._divs[-1][1]:
+                capture = _TableCapture()
+                self._captures.append(capture)
+                self._pending.append(capture)
+        elif tag in ('td', 'th') and self._captures:
+            self._close_cells(self._tables)
+            self._cells.append((self._tables, []))
+        elif tag == 'tr' and self._captures:
+            self._close_cells(self._tables)
+            self._end_row()
+            for capture in self._captures:
+                if not capture.depth:
+                    capture.row_open = True
+        self._emit(self.get_starttag_text())
+
+    def handle_startendtag(self, tag, attrs):
+        self._flush_text()
+        self._emit(self.get_starttag_text())
+
+    def handle_endtag(self, tag):
+        self._flush_text()
+        self._emit(f"</{tag}>")
+        if tag == 'div':
+            if self._divs:
+                self._divs.pop()
+        elif tag == 'table':
+            # Cells left open in the table end with it
+            self._close_cells(self._tables)
+            self._tables = max(0, self._tables - 1)
+            # Only the innermost open table can be the one that ends here
+            for capture in list(self._captures):
+                if capture.depth:
+                    capture.depth -= 1
+                else:
+                    self._captures.remove(capture)
+                    self._end_capture(capture)
+            if not self._captures:
+                self._cells.clear()
+        elif tag in ('td', 'th'):
+            self._close_cells(self._tables)
+        elif tag == 'tr' and self._captures:
+            self._close_cells(self._tables)
+            self._end_row()
+
+    def handle_data(self, data):
+        self._text.append(data)
+        self._emit(data)
+
+    def handle_entityref(self, name):
+        self._text.append(f"&{name};")
+        self._emit(f"&{name};")
+
+    def handle_charref(self, name):
+        self._text.append(f"&#{name};")
+        self._emit(f"&#{name};")
+
+    def handle_comment(self, data):
+        self._flush_text()
+        self._emit(f"<!--{data}-->")
+
+    def handle_decl(self, decl):
+        self._flush_text()
+
+    def handle_pi(self, data):
+        self._flush_text()
+
+    def unknown_decl(self, data):
+        self._flush_text()
+        self._emit(f"<![{data}]>")
+
 class HTMLTableConverter:
     HEADER_INDICATOR = 'タイトル'
+    MANIFEST_NAME = '.htmlTable2XLS_manifest.json'
 
-    def __init__(self, input_dir: str = "."):
+    def __init__(self, input_dir: str = ".", streaming: bool = True, header_rows: Optional[int] = None,
+                 via_csv: bool = False, sheet_per_table: bool = False,
+                 max_rowspan: Optional[int] = None, max_colspan: Optional[int] = MAX_COLUMNS,
+                 workers: int = 1, header_indicator: str = HEADER_INDICATOR,
+                 wrap_class: str = TABLE_WRAP_CLASS, block_class: str = TABLE_BLOCK_CLASS):
         self.input_dir = Path(input_dir)
+        self.header_indicator = header_indicator
+        self.wrap_class = wrap_class
+        self.block_class = block_class
+        self.streaming = streaming
+        self.header_rows = header_rows
+        self.via_csv = via_csv
+        self.sheet_per_table = sheet_per_table
+        self.max_rowspan = max_rowspan
+        self.max_colspan = max_colspan
+        self.workers = workers
         
     def get_html_files(self) -> List[Path]:
         """Return all HTML files in the input directory and its subdirectories."""
@@ -26,7 +250,7 @@ class HTMLTableConverter:
     def _has_required_header(self, table) -> bool:
         """Check if table contains the required header indicator."""
         headers = table.find_all(['th', 'td'])
-        return any(self.HEADER_INDICATOR in html.unescape(header.get_text(strip=True)) 
+        return any(self.header_indicator in html.unescape(header.get_text(strip=True)) 
                   for header in headers)
 
     def _get_cell_text(self, cell) -> str:
@@ -60,83 +284,191 @@ class HTMLTableConverter:
         Extract data from a table, handling colspan and rowspan.
         Returns a list of rows, where each row is a list of cell values.
         """
-        rows = table.find_all('tr')
-        
-        # First pass: determine the maximum number of columns
+        return list(self.iter_table_rows(table))
+
+    def _span(self, cell, name: str, limit: Optional[int]) -> int:
+        """Return a cell's rowspan or colspan, at least 0 and at most limit."""
+        span = max(0, int(cell.get(name, 1)))
+        return min(span, limit) if limit is not None else span
+
+    def iter_table_rows(self, table) -> Iterator[List[str]]:
+        """
+        Yield the rows of a table one at a time, with colspan and rowspan expanded.
+
+        Each column keeps the rowspans that still cover coming rows, and a
+        row is only filled from them when it is emitted, so time and memory
+        are linear in the size of the output instead of in rowspan x colspan.
+        Every row has as many columns as the widest row of the table; spans
+        are cut off at the last row and last column. Where spans overlap,
+        the cell that comes later in the table wins. Spans are clamped to
+        max_rowspan/max_colspan.
+        """
+        # Tuples, because a ResultSet per row costs about 1 KB
+        rows = [tuple(row.find_all(['td', 'th'])) for row in table.find_all('tr')]
         max_cols = 0
-        for row in rows:
-            col_count = 0
-            for cell in row.find_all(['td', 'th']):
-                colspan = int(cell.get('colspan', 1))
-                col_count += colspan
-            max_cols = max(max_cols, col_count)
-
-        # Initialize the grid with None
-        grid = [[None] * max_cols for _ in range(len(rows))]
-        
-        # Process the table
-        for row_idx, row in enumerate(rows):
+        for cells in rows:
+            max_cols = max(max_cols, sum(self._span(cell, 'colspan', self.max_colspan) for cell in cells))
+
+        # Column -> [value, last row index] of each rowspan still covering it,
+        # in the order they were added
+        active: Dict[int, List[List]] = {}
+
+        for row_idx, cells in enumerate(rows):
+            values: List[Optional[str]] = [None] * max_cols
+            for col in list(active):
+                spans = [span for span in active[col] if span[1] >= row_idx]
+                if spans:
+                    active[col] = spans
+                    values[col] = spans[-1][0]
+                else:
+                    del active[col]
+
             col_idx = 0
-            
-            for cell in row.find_all(['td', 'th']):
+            for cell in cells:
                 # Skip cells that are already filled
-                while col_idx < max_cols and grid[row_idx][col_idx] is not None:
+                while col_idx < max_cols and values[col_idx] is not None:
                     col_idx += 1
-                
+
                 if col_idx >= max_cols:
                     break
 
-                # Get cell properties
-                rowspan = int(cell.get('rowspan', 1))
-                colspan = int(cell.get('colspan', 1))
+                rowspan = self._span(cell, 'rowspan', self.max_rowspan)
+                colspan = self._span(cell, 'colspan', self.max_colspan)
                 cell_value = self._get_cell_text(cell)
 
-                # Fill the spanned cells
-                for i in range(rowspan):
-                    for j in range(colspan):
-                        if row_idx + i < len(grid) and col_idx + j < len(grid[0]):
-                            grid[row_idx + i][col_idx + j] = cell_value
+                if rowspan:
+                    for col in range(col_idx, min(col_idx + colspan, max_cols)):
+                        values[col] = cell_value
+                        if rowspan > 1:
+                            active.setdefault(col, []).append([cell_value, row_idx + rowspan - 1])
 
                 col_idx += colspan
 
-        # Convert None to empty string in the final output
-        return [[cell if cell is not None else '' for cell in row] for row in grid]
+            yield [value if value is not None else '' for value in values]
 
-    def read_html(self, html_file: Path) -> Optional[Path]:
+    def select_tables(self, html_file: Path) -> Iterator:
         """
-        Read HTML file and convert tables to CSV.
-        Only processes tables containing the required header indicator.
+        Yield the tables of an HTML file that are inside div.table-wrap div.table-block
+        and contain the required header indicator.
+        With streaming, only the selected tables are built into trees; otherwise
+        the whole page is parsed first.
+        """
+        if self.streaming:
+            extractor = StreamingTableExtractor(self.header_indicator, self.header_rows,
+                                                self.wrap_class, self.block_class)
+            yield from extractor.iter_tables(html_file)
+            return
+
+        from bs4 import BeautifulSoup
+
+        with open(html_file, "r", encoding="utf-8") as file:
+            soup = BeautifulSoup(file, "html.parser")
+
+        all_tables = soup.select(f"div.{self.wrap_class} div.{self.block_class} table")
+        for table in all_tables:
+            if self._has_required_header(table):
+                yield table
+
+    def _write_csv(self, html_file: Path) -> Optional[Path]:
+        """
+        Convert the matching tables of an HTML file to CSV.
         Returns the path to the created CSV file or None if no valid tables found.
+        Errors are raised to the caller.
         """
         csv_filename = html_file.with_suffix('.csv')
-        
-        try:
-            with open(html_file, "r", encoding="utf-8") as file:
-                soup = BeautifulSoup(file, "html.parser")
-
-            all_tables = soup.select("div.table-wrap div.table-block table")
-            tables = [table for table in all_tables if self._has_required_header(table)]
-            
-            if not tables:
-                logging.warning(f"No tables with header '{self.HEADER_INDICATOR}' found in {html_file}")
-                return None
 
-            with open(csv_filename, "w", encoding="utf-8", newline="") as csvfile:
-                writer = csv.writer(csvfile, quoting=csv.QUOTE_ALL)
+        tables = self._first_table_or_none(html_file)
+        if tables is None:
+            return None
+
+        table_count = row_count = 0
+        with open(csv_filename, "w", encoding="utf-8", newline="") as csvfile:
+            writer = csv.writer(csvfile, quoting=csv.QUOTE_ALL)
+
+            for table in tables:
+                table_count += 1
+                for row in METRICS.timed("extract", self.iter_table_rows(table)):
+                    writer.writerow(row)
+                    row_count += 1
+
+        METRICS.record_file(html_file, tables=table_count, rows=row_count)
+        logging.info(f"Successfully created CSV: {csv_filename}")
+        return csv_filename
+
+    def _first_table_or_none(self, html_file: Path) -> Optional[Iterator]:
+        """
+        Return an iterator over the selected tables of an HTML file, or None
+        (with a warning) if there is none. Only the first table is read ahead.
+        Parsing is timed as the "parse" stage of METRICS.
+        """
+        tables = METRICS.timed("parse", self.select_tables(html_file))
+        first = next(tables, None)
+        if first is None:
+            logging.warning(f"No tables with header '{self.header_indicator}' found in {html_file}")
+            return None
+        return chain([first], tables)
+
+    def _text_cell(self, worksheet, value: str):
+        """
+        Return a write-only cell holding value as text, or None for an empty cell.
+        Values starting with '=' are kept as text instead of becoming formulas.
+        """
+        from openpyxl.cell import WriteOnlyCell
+
+        if not value:
+            return None
+        cell = WriteOnlyCell(worksheet, value)
+        cell.data_type = 's'
+        return cell
+
+    def _write_xlsx(self, html_file: Path) -> Optional[Path]:
+        """
+        Write the matching tables of an HTML file straight to Excel, row by row.
+        Uses a write-only workbook, so rows are flushed to disk as they are
+        added, and every cell is written as text. With sheet_per_table each
+        table gets its own sheet, otherwise all tables are stacked in one.
+        Returns the path to the created Excel file or None if no valid tables found.
+        Errors are raised to the caller.
+        """
+        from openpyxl import Workbook
+
+        xlsx_path = html_file.with_suffix('.xlsx')
+
+        tables = self._first_table_or_none(html_file)
+        if tables is None:
+            return None
 
-                for table in tables:
-                    table_data = self._extract_table_data(table)
-                    writer.writerows(table_data)
+        workbook = Workbook(write_only=True)
+        worksheet = None
+        table_count = row_count = 0
+        for table_count, table in enumerate(tables, start=1):
+            if worksheet is None or self.sheet_per_table:
+                worksheet = workbook.create_sheet(f"Table{table_count}" if self.sheet_per_table else "Sheet1")
+            for row in METRICS.timed("extract", self.iter_table_rows(table)):
+                worksheet.append([self._text_cell(worksheet, value) for value in row])
+                row_count += 1
+        workbook.save(xlsx_path)
+        METRICS.record_file(html_file, tables=table_count, rows=row_count)
 
-            logging.info(f"Successfully created CSV: {csv_filename}")
-            return csv_filename
+        logging.info(f"Successfully created Excel file: {xlsx_path}")
+        return xlsx_path
 
+    def read_html(self, html_file: Path) -> Optional[Path]:
+        """
+        Read HTML file and convert tables to CSV.
+        Only processes tables containing the required header indicator.
+        Returns the path to the created CSV file or None if no valid tables found.
+        """
+        try:
+            return self._write_csv(html_file)
         except Exception as e:
             logging.error(f"Error processing {html_file}: {str(e)}")
             return None
 
     def write_excel(self, html_file: Path, csv_file: Path) -> Optional[Path]:
         """Convert CSV to Excel file."""
+        import pandas as pd
+
         try:
             df = pd.read_csv(csv_file, encoding="utf-8", header=None)
             xlsx_path = html_file.with_suffix('.xlsx')
@@ -147,24 +479,160 @@ class HTMLTableConverter:
             logging.error(f"Error creating Excel file from {csv_file}: {str(e)}")
             return None
 
-    def process_files(self):
-        """Process all HTML files in the input directory."""
-        html_files = self.get_html_files()
+    def _convert_file(self, html_file: Path) -> Optional[List[Path]]:
+        """
+        Convert one HTML file to Excel, directly or, with via_csv, through CSV.
+        Returns the created files, an empty list if the file has no matching
+        table, or None if the conversion failed.
+        Besides parsing and table extraction, the time taken counts as the
+        "write" stage of METRICS; the bytes read and written are recorded.
+        """
+        start = time.perf_counter()
+        with METRICS.stage("write"):
+            outputs = self._write_outputs(html_file)
+        if outputs:
+            METRICS.record_file(html_file, input_bytes=html_file.stat().st_size,
+                                output_bytes=sum(output.stat().st_size for output in outputs),
+                                seconds=round(time.perf_counter() - start, 6))
+        return outputs
+
+    def _write_outputs(self, html_file: Path) -> Optional[List[Path]]:
+        """Write the outputs of _convert_file."""
+        if not self.via_csv:
+            try:
+                xlsx_file = self._write_xlsx(html_file)
+            except Exception as e:
+                logging.error(f"Error processing {html_file}: {str(e)}")
+                return None
+            return [xlsx_file] if xlsx_file else []
+
+        try:
+            csv_file = self._write_csv(html_file)
+        except Exception as e:
+            logging.error(f"Error processing {html_file}: {str(e)}")
+            return None
+
+        if not csv_file:
+            return []
+
+        xlsx_file = self.write_excel(html_file, csv_file)
+        return [csv_file, xlsx_file] if xlsx_file else None
+
+    def process_files(self, force: bool = False, html_files: Optional[List[Path]] = None):
+        """
+        Process all HTML files in the input directory, or only html_files when
+        given (e.g. the files a watcher saw change).
+        Files unchanged since the last run are skipped unless force is True;
+        outputs of HTML files that were deleted are removed.
+        """
+        searched = html_files is None
+        html_files = self.get_html_files() if searched else [Path(html_file) for html_file in html_files]
+        manifest = BuildManifest(str(self.input_dir / self.MANIFEST_NAME),
+                                 {"header_indicator": self.header_indicator, "header_rows": self.header_rows,
+                                  "wrap_class": self.wrap_class, "block_class": self.block_class,
+                                  "via_csv": self.via_csv, "sheet_per_table": self.sheet_per_table,
+                                  "max_rowspan": self.max_rowspan, "max_colspan": self.max_colspan},
+                                 force=force)
         
-        if not html_files:
+        pending = [html_file for html_file in html_files if not manifest.is_up_to_date(str(html_file))]
+        manifest.prune()
+        
+        if not html_files and searched:
             logging.warning(f"No HTML files found in {self.input_dir}")
-            return
+        elif len(pending) < len(html_files):
+            logging.info(f"Up to date: {len(html_files) - len(pending)} files")
+
+        if self.workers != 1 and len(pending) > 1:
+            jobs = [(str(html_file), (self, html_file)) for html_file in pending]
+            # The summary below covers both paths, so run_parallel prints none
+            statuses = run_parallel(_convert_file_job, jobs, self.workers, summary=False)
+        else:
+            statuses = []
+            for html_file in pending:
+                logging.info(f"Processing: {html_file}")
+                statuses.append(_file_status(self._convert_file(html_file)))
+
+        skipped = []
+        failed = []
+        for html_file, status in zip(pending, statuses):
+            if status is False:
+                failed.append(html_file)
+                continue
+            if status is None:
+                skipped.append(html_file)
+            manifest.record(str(html_file), [str(output) for output in status or []])
+
+        METRICS.count("converted", len(pending) - len(skipped) - len(failed))
+        METRICS.count("skipped", len(skipped))
+        METRICS.count("failed", len(failed))
+        METRICS.count("up_to_date", len(html_files) - len(pending))
+        if pending:
+            logging.info(f"Converted: {len(pending) - len(skipped) - len(failed)}, "
+                         f"Skipped (no matching table): {len(skipped)}, Failed: {len(failed)}")
+            for html_file in skipped:
+                logging.info(f"Skipped: {html_file}")
+            for html_file in failed:
+                logging.info(f"Failed: {html_file}")
+
+        manifest.save()
+
+def _file_status(outputs: Optional[List[Path]]):
+    """
+    Map the result of _convert_file to a run_parallel status: the outputs when
+    converted, None when the file has no matching table and False on failure.
+    """
+    if outputs is None:
+        return False
+    return outputs or None
+
+def _convert_file_job(converter: HTMLTableConverter, html_file: Path):
+    """
+    Convert one HTML file in a worker process of run_parallel.
+    Log records are written to stdout while the file is converted, so they
+    are captured and printed with the other output of the file.
+    """
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    root = logging.getLogger()
+    handlers, root.handlers = root.handlers, [handler]
+    try:
+        return _file_status(converter._convert_file(html_file))
+    finally:
+        root.handlers = handlers
+
+def add_arguments(parser):
+    """Add the options of this tool to an argument parser."""
+    parser.add_argument("--input-dir", default=".", help="directory tree to search for HTML files (default: %(default)s)")
+    parser.add_argument("--force", action="store_true", help="convert every HTML file, even if it is unchanged since the last run")
+    parser.add_argument("--header-indicator", default=HTMLTableConverter.HEADER_INDICATOR,
+                        help="text a table must contain to be converted (default: %(default)s)")
+    parser.add_argument("--table-wrap-class", default=TABLE_WRAP_CLASS,
+                        help="class of the outer div around the tables (default: %(default)s)")
+    parser.add_argument("--table-block-class", default=TABLE_BLOCK_CLASS,
+                        help="class of the inner div around the tables (default: %(default)s)")
+    parser.add_argument("--full-parse", action="store_true", help="parse whole pages instead of streaming only the selected tables")
+    parser.add_argument("--header-rows", type=int, help="only look for the header indicator in the first N rows of each table")
+    parser.add_argument("--via-csv", action="store_true", help="write a CSV file first and convert it to Excel with pandas")
+    parser.add_argument("--sheet-per-table", action="store_true", help="write each matching table to its own sheet")
+    parser.add_argument("--max-rowspan", type=int, help="clamp rowspan attributes to this value")
+    parser.add_argument("--max-colspan", type=int, default=MAX_COLUMNS, help="clamp colspan attributes to this value (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=1, help="convert files in N processes in parallel (0 = one per CPU core)")
+    add_metrics_arguments(parser, "htmlTable2XLS")
 
-        for html_file in html_files:
-            logging.info(f"Processing: {html_file}")
-            csv_file = self.read_html(html_file)
-            
-            if csv_file:
-                self.write_excel(html_file, csv_file)
+def run(args, paths=None):
+    """Run the tool with parsed options; paths limits the run to these HTML files (see process_files)."""
+    converter = HTMLTableConverter(args.input_dir, streaming=not args.full_parse, header_rows=args.header_rows,
+                                   via_csv=args.via_csv, sheet_per_table=args.sheet_per_table,
+                                   max_rowspan=args.max_rowspan, max_colspan=args.max_colspan,
+                                   workers=args.workers, header_indicator=args.header_indicator,
+                                   wrap_class=args.table_wrap_class, block_class=args.table_block_class)
+    with record_run("htmlTable2XLS", args.metrics, args.profile):
+        converter.process_files(force=args.force, html_files=paths)
 
 def main():
-    converter = HTMLTableConverter()
-    converter.process_files()
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    add_arguments(parser)
+    run(parser.parse_args())
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
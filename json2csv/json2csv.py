@@ -1,11 +1,21 @@
+import os
 import sys
 import json
 import csv
+import heapq
+import pickle
 import logging
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby, islice
 from pathlib import Path
-from typing import Dict, List, Tuple, Any
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Any
 from dataclasses import dataclass
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.metrics import METRICS, add_metrics_arguments, record_run
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -13,12 +23,25 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Entries per pickled batch in the on-disk runs of the external merge mode
+RUN_BATCH = 1024
+# Most run files open at once when restoring first-seen key order
+MERGE_FAN_IN = 32
+
+DESCRIPTION = "Merge per-language JSON translation files into one CSV file."
+
 @dataclass
 class TranslationConfig:
     """Configuration settings for translation processing."""
     json_folder: Path
     output_csv: Path
     separator: str = '.'
+    expand_lists: bool = True  # Flatten list items to indexed keys instead of writing the list as a value
+    external_merge: bool = False  # Merge sorted on-disk runs instead of loading every file into memory
+    keep_key_order: bool = False  # With external_merge, write keys in first-seen order instead of sorted
+    run_size: int = 10_000  # Rows per sorted chunk when restoring first-seen key order
+    temp_dir: Optional[Path] = None  # Folder for the on-disk runs (system default if None)
+    workers: int = 1  # Processes parsing JSON files in parallel (0 = one per CPU core)
 
 class TranslationError(Exception):
     """Custom exception for translation-related errors."""
@@ -30,13 +53,26 @@ class JsonTranslationHandler:
     def __init__(self, config: TranslationConfig):
         """Initialize the handler with configuration settings."""
         self.config = config
-        self.data: Dict[str, Dict[str, Any]] = {}
+        # Columnar store: every key is stored once and mapped to a row index,
+        # and every language has one column list indexed by row. Missing
+        # translations are None (written as empty cells).
+        self.keys: List[str] = []
+        self.key_index: Dict[str, int] = {}
+        self.columns: Dict[str, List[Any]] = {}
         self.languages: List[str] = []
         
     def flatten_json(self, nested_json: Dict, parent_key: str = '') -> Dict[str, Any]:
         """
         Flatten a nested JSON object into a single-level dictionary.
         
+        Works with an explicit stack of key segments instead of recursion, so
+        nesting depth is not limited by the recursion limit, and writes every
+        leaf straight into one output dictionary. Keys are joined once per
+        level, keeping time and memory linear in the size of the output.
+        When config.expand_lists is set, list items get their index as key
+        segment (e.g. items.0.title); otherwise lists are kept as values.
+        Empty objects and lists produce no keys.
+        
         Args:
             nested_json: The nested JSON dictionary to flatten
             parent_key: The parent key for nested structures
@@ -44,16 +80,72 @@ class JsonTranslationHandler:
         Returns:
             A flattened dictionary with dot-notation keys
         """
+        separator = self.config.separator
+        expand_lists = self.config.expand_lists
         items: Dict[str, Any] = {}
-        for key, value in nested_json.items():
-            new_key = f"{parent_key}{self.config.separator}{key}" if parent_key else key
-            
-            if isinstance(value, dict):
-                items.update(self.flatten_json(value, new_key))
+        path: List[str] = [parent_key] if parent_key else []
+        prefix = None  # Joined path of the current level, built at its first leaf
+        levels = [iter(nested_json.items())]
+        
+        while levels:
+            for key, value in levels[-1]:
+                if isinstance(value, dict):
+                    children = iter(value.items())
+                elif expand_lists and isinstance(value, list):
+                    children = enumerate(value)
+                else:
+                    if prefix is None:
+                        prefix = separator.join(path) + separator if path else ''
+                    items[f"{prefix}{key}"] = value
+                    continue
+                path.append(str(key))
+                levels.append(children)
+                prefix = None
+                break
             else:
-                items[new_key] = value
+                levels.pop()
+                if levels:
+                    path.pop()
+                prefix = None
         return items
 
+    def unflatten_json(self, flat_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Rebuild a nested JSON object from a dictionary made by flatten_json.
+        
+        When config.expand_lists is set, objects whose keys are exactly
+        0..n-1 are turned back into lists.
+        
+        Args:
+            flat_data: A flattened dictionary with dot-notation keys
+            
+        Returns:
+            The nested JSON dictionary
+        """
+        separator = self.config.separator
+        root: Dict[str, Any] = {}
+        containers = [root]
+        
+        for flat_key, value in flat_data.items():
+            node = root
+            *parents, leaf = flat_key.split(separator)
+            for part in parents:
+                child = node.get(part)
+                if not isinstance(child, dict):
+                    child = node[part] = {}
+                    containers.append(child)
+                node = child
+            node[leaf] = value
+        
+        if self.config.expand_lists:
+            # Containers are listed parents first, so walking them backwards
+            # converts every child before its parent is inspected.
+            for node in reversed(containers):
+                for key, value in node.items():
+                    if isinstance(value, dict) and value and list(value) == [str(i) for i in range(len(value))]:
+                        node[key] = list(value.values())
+        return root
+
     def load_json_files(self) -> None:
         """
         Load and process all JSON files from the specified folder.
@@ -62,12 +154,24 @@ class JsonTranslationHandler:
             TranslationError: If there are issues with file processing
         """
         try:
-            json_files = list(self.config.json_folder.glob("*.json"))
+            json_files = self._json_files()
             if not json_files:
                 raise TranslationError(f"No JSON files found in {self.config.json_folder}")
 
-            for json_file in json_files:
-                self._process_json_file(json_file)
+            workers = self.config.workers or os.cpu_count() or 1
+            if workers > 1 and len(json_files) > 1:
+                # Files are parsed and flattened in worker processes; results
+                # come back in file order, so keys keep the serial order.
+                with ProcessPoolExecutor(max_workers=min(workers, len(json_files))) as executor:
+                    results = executor.map(_read_flat_columns, [self.config] * len(json_files), json_files)
+                    for json_file, (keys, values, metrics) in zip(json_files, results):
+                        METRICS.merge(metrics)
+                        self.languages.append(json_file.stem)
+                        with METRICS.stage("merge"):
+                            self._add_column(json_file.stem, zip(keys, values))
+            else:
+                for json_file in json_files:
+                    self._process_json_file(json_file)
             
             self.languages.sort()
             logger.info(f"Successfully loaded {len(json_files)} JSON files")
@@ -75,6 +179,13 @@ class JsonTranslationHandler:
         except Exception as e:
             raise TranslationError(f"Error loading JSON files: {str(e)}") from e
 
+    def _json_files(self) -> List[Path]:
+        """
+        Return the <lang>.json files of the input folder.
+        Hidden files, such as a metrics file written into the folder, are skipped.
+        """
+        return [path for path in self.config.json_folder.glob("*.json") if not path.name.startswith('.')]
+
     def _process_json_file(self, json_file: Path) -> None:
         """
         Process a single JSON file and update the translation data.
@@ -84,16 +195,33 @@ class JsonTranslationHandler:
         """
         lang = json_file.stem # Use filename as language identifier
         self.languages.append(lang)
+        flat_data = self._read_json_file(json_file)
+        with METRICS.stage("merge"):
+            self._add_column(lang, flat_data.items())
+
+    def _read_json_file(self, json_file: Path) -> Dict[str, Any]:
+        """
+        Parse a single JSON file and flatten it.
+        
+        Parsing and flattening are timed as the "load" and "flatten" stages
+        of METRICS, and the keys and bytes of the file are recorded.
         
+        Args:
+            json_file: Path to the JSON file to read
+            
+        Returns:
+            The flattened translations of the file
+            
+        Raises:
+            TranslationError: If the file cannot be read or is not valid JSON
+        """
         try:
-            with json_file.open('r', encoding='utf-8') as f:
-                json_data = json.load(f)
-                flat_data = self.flatten_json(json_data)
-                
-                for key, value in flat_data.items():
-                    if key not in self.data:
-                        self.data[key] = {}
-                    self.data[key][lang] = value
+            with METRICS.stage("load"), json_file.open('r', encoding='utf-8') as f:
+                data = json.load(f)
+            with METRICS.stage("flatten"):
+                flat_data = self.flatten_json(data)
+            METRICS.record_file(json_file, keys=len(flat_data), input_bytes=json_file.stat().st_size)
+            return flat_data
                     
         except json.JSONDecodeError as e:
             logger.error(f"Invalid JSON in file {json_file}: {str(e)}")
@@ -102,6 +230,31 @@ class JsonTranslationHandler:
             logger.error(f"Error processing file {json_file}: {str(e)}")
             raise TranslationError(f"Error processing {json_file}") from e
 
+    def _add_column(self, lang: str, flat_items: Iterable[Tuple[str, Any]]) -> None:
+        """
+        Store the flattened translations of one language as a column.
+        
+        Keys seen for the first time are appended to the key list in order,
+        so rows keep the first-seen key order across files.
+        
+        Args:
+            lang: Language of the translations
+            flat_items: (key, value) pairs of the flattened translations of that language
+        """
+        keys = self.keys
+        key_index = self.key_index
+        column = self.columns.setdefault(lang, [])
+        column.extend([None] * (len(keys) - len(column)))
+        
+        for key, value in flat_items:
+            row = key_index.get(key)
+            if row is None:
+                row = key_index[key] = len(keys)
+                keys.append(key)
+                column.append(value)
+            else:
+                column[row] = value
+
     def write_csv_output(self) -> None:
         """
         Write the processed translation data to a CSV file.
@@ -110,47 +263,249 @@ class JsonTranslationHandler:
             TranslationError: If there are issues writing the CSV file
         """
         try:
-            with self.config.output_csv.open('w', newline='', encoding='utf-8') as f:
+            with METRICS.stage("write"), self.config.output_csv.open('w', newline='', encoding='utf-8') as f:
                 writer = csv.writer(f)
                 header = ["Key"] + self.languages
                 writer.writerow(header)
                 
-                for key, translations in self.data.items():
-                    row = [key] + [translations.get(lang, '') for lang in self.languages]
-                    writer.writerow(row)
+                # Pad columns of languages that miss the most recent keys,
+                # then emit all rows at once by zipping the columns.
+                columns = []
+                for lang in self.languages:
+                    column = self.columns[lang]
+                    column.extend([None] * (len(self.keys) - len(column)))
+                    columns.append(column)
+                writer.writerows(zip(self.keys, *columns))
+            METRICS.count("rows", len(self.keys))
+            METRICS.count("output_bytes", self.config.output_csv.stat().st_size)
                     
             logger.info(f"Successfully created CSV file: {self.config.output_csv}")
             
         except Exception as e:
             raise TranslationError(f"Error writing CSV file: {str(e)}") from e
 
-def main() -> None:
-    """Main entry point for the translation processor."""
-    try:
-        if len(sys.argv) != 3:
-            raise ValueError("Incorrect number of arguments")
+    def write_csv_external(self) -> None:
+        """
+        Write the CSV file without holding all translations in memory.
+        
+        Every JSON file is flattened into a run sorted by key on disk, one
+        file at a time, and the runs are k-way merged by key to stream the
+        rows. Peak memory is bounded by the largest single file and the
+        number of languages, not by the total number of keys. Rows are
+        sorted by key unless config.keep_key_order is set, in which case
+        the merged rows are sorted again, in chunks of config.run_size,
+        by the position where each key was first seen, which is the order
+        of the in-memory mode.
+        
+        Raises:
+            TranslationError: If there are issues with file processing
+        """
+        json_files = self._json_files()
+        if not json_files:
+            raise TranslationError(f"No JSON files found in {self.config.json_folder}")
+        
+        with tempfile.TemporaryDirectory(dir=self.config.temp_dir) as temp_dir:
+            runs = [self._write_sorted_run(json_file, Path(temp_dir)) for json_file in json_files]
+            # File order decides the first-seen key order, column order is sorted
+            file_langs = [json_file.stem for json_file in json_files]
+            self.languages = sorted(file_langs)
+            column_of = {lang: self.languages.index(lang) for lang in file_langs}
+            
+            entries = heapq.merge(
+                *(self._read_run(run, file_index) for file_index, run in enumerate(runs))
+            )
+            rows = self._merge_rows(entries, [column_of[lang] for lang in file_langs])
+            if self.config.keep_key_order:
+                rows = self._sort_rows_by_rank(rows, Path(temp_dir))
+            
+            try:
+                # Runs are merged while the rows are written, so merging counts as writing
+                with METRICS.stage("write"), self.config.output_csv.open('w', newline='', encoding='utf-8') as f:
+                    writer = csv.writer(f)
+                    writer.writerow(["Key"] + self.languages)
+                    written = 0
+                    for _, row in rows:
+                        writer.writerow(row)
+                        written += 1
+                METRICS.count("rows", written)
+                METRICS.count("output_bytes", self.config.output_csv.stat().st_size)
+                logger.info(f"Successfully created CSV file: {self.config.output_csv}")
+            except Exception as e:
+                raise TranslationError(f"Error writing CSV file: {str(e)}") from e
+
+    def _write_sorted_run(self, json_file: Path, temp_dir: Path) -> Path:
+        """
+        Flatten one JSON file into a run file of (key, position, value) entries sorted by key.
+        
+        Args:
+            json_file: Path to the JSON file to process
+            temp_dir: Folder for the run file
+            
+        Returns:
+            Path to the run file
+        """
+        run_path = temp_dir / f"{json_file.stem}.run"
+        flat_data = self._read_json_file(json_file)
+        with METRICS.stage("sort"):
+            entries = sorted((key, position, value) for position, (key, value) in enumerate(flat_data.items()))
+            del flat_data
+            self._write_run(run_path, entries)
+        return run_path
+
+    @staticmethod
+    def _write_run(run_path: Path, entries) -> None:
+        """Write entries to a run file as pickled batches of RUN_BATCH entries."""
+        entries = iter(entries)
+        with run_path.open('wb') as f:
+            while True:
+                batch = list(islice(entries, RUN_BATCH))
+                if not batch:
+                    break
+                pickle.dump(batch, f, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _iter_run(run_path: Path) -> Iterator[Any]:
+        """Yield the entries of a run file, loading one batch at a time."""
+        with run_path.open('rb') as f:
+            while True:
+                try:
+                    batch = pickle.load(f)
+                except EOFError:
+                    return
+                yield from batch
+
+    def _read_run(self, run_path: Path, file_index: int) -> Iterator[Tuple]:
+        """
+        Yield the entries of a key-sorted run file as (key, file_index, position, value),
+        so entries with the same key are ordered by file when runs are merged.
+        """
+        for key, position, value in self._iter_run(run_path):
+            yield key, file_index, position, value
+
+    def _merge_rows(self, entries: Iterator[Tuple], file_columns: List[int]) -> Iterator[Tuple[Tuple[int, int], List[Any]]]:
+        """
+        Group merged (key, file_index, position, value) entries into CSV rows.
+        
+        Yields (rank, row) pairs, where rank is the (file_index, position)
+        at which the key was first seen and row is the key followed by one
+        value per language (None where the translation is missing).
+        """
+        for key, group in groupby(entries, key=lambda entry: entry[0]):
+            row = [key] + [None] * len(self.languages)
+            rank = None
+            for _, file_index, position, value in group:
+                if rank is None:
+                    rank = (file_index, position)
+                row[file_columns[file_index] + 1] = value
+            yield rank, row
+
+    def _sort_rows_by_rank(self, rows: Iterator[Tuple[Tuple[int, int], List[Any]]], temp_dir: Path) -> Iterator[Tuple[Tuple[int, int], List[Any]]]:
+        """
+        Sort (rank, row) pairs by rank with an external merge sort.
+        
+        Rows are sorted in chunks of config.run_size that are written to run
+        files. Runs are merged MERGE_FAN_IN at a time into longer runs until
+        at most MERGE_FAN_IN are left, which are merged back into one stream,
+        so open files and read buffers do not grow with the number of keys.
+        """
+        sort_key = lambda item: item[0]
+        runs = []
+        while True:
+            chunk = sorted(islice(rows, self.config.run_size), key=sort_key)
+            if not chunk:
+                break
+            run_path = temp_dir / f"rank{len(runs)}.run"
+            self._write_run(run_path, chunk)
+            runs.append(run_path)
         
+        written = len(runs)
+        while len(runs) > MERGE_FAN_IN:
+            merged = []
+            for start in range(0, len(runs), MERGE_FAN_IN):
+                group = runs[start:start + MERGE_FAN_IN]
+                if len(group) == 1:
+                    merged.extend(group)
+                    continue
+                run_path = temp_dir / f"rank{written}.run"
+                written += 1
+                self._write_run(run_path, heapq.merge(*(self._iter_run(run) for run in group), key=sort_key))
+                for run in group:
+                    run.unlink()
+                merged.append(run_path)
+            runs = merged
+        return heapq.merge(*(self._iter_run(run) for run in runs), key=sort_key)
+
+def _read_flat_columns(config: TranslationConfig, json_file: Path) -> Tuple[List[str], List[Any], Dict[str, Any]]:
+    """
+    Parse and flatten one JSON file in a worker process.
+    
+    Returns the keys and values as two lists, which are cheaper to send
+    back to the main process than a dictionary, and the METRICS snapshot
+    of this file to be merged in the main process.
+    """
+    METRICS.reset()
+    flat_data = JsonTranslationHandler(config)._read_json_file(json_file)
+    return list(flat_data), list(flat_data.values()), METRICS.snapshot()
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the options of this tool to an argument parser."""
+    parser.add_argument("json_folder", type=Path, help="folder containing <lang>.json files")
+    parser.add_argument("output_csv", type=Path, help="CSV file to write")
+    parser.add_argument("--external", action="store_true",
+                        help="merge sorted runs on disk instead of loading every file into memory")
+    parser.add_argument("--keep-key-order", action="store_true",
+                        help="with --external, keep first-seen key order instead of sorting keys")
+    parser.add_argument("--temp-dir", type=Path, help="folder for the on-disk runs of --external")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes parsing JSON files in parallel (0 = one per CPU core)")
+    parser.add_argument("--separator", default='.', help="separator of nested key segments (default: %(default)s)")
+    parser.add_argument("--keep-lists", action="store_true",
+                        help="write lists as values instead of flattening their items to indexed keys")
+    parser.add_argument("--run-size", type=int, default=TranslationConfig.run_size,
+                        help="with --keep-key-order, rows per sorted chunk on disk (default: %(default)s)")
+    add_metrics_arguments(parser, "json2csv")
+
+def run(args: argparse.Namespace) -> None:
+    """Run the tool with parsed options; exits with status 1 on errors."""
+    try:
         config = TranslationConfig(
-            json_folder=Path(sys.argv[1]),
-            output_csv=Path(sys.argv[2])
+            json_folder=args.json_folder,
+            output_csv=args.output_csv,
+            separator=args.separator,
+            expand_lists=not args.keep_lists,
+            external_merge=args.external,
+            keep_key_order=args.keep_key_order,
+            run_size=args.run_size,
+            temp_dir=args.temp_dir,
+            workers=args.workers
         )
         
         if not config.json_folder.exists():
             raise TranslationError(f"Input folder does not exist: {config.json_folder}")
         
         handler = JsonTranslationHandler(config)
-        handler.load_json_files()
-        handler.write_csv_output()
+        with record_run("json2csv", args.metrics, args.profile):
+            if config.external_merge:
+                handler.write_csv_external()
+            else:
+                handler.load_json_files()
+                handler.write_csv_output()
         
     except (ValueError, TranslationError) as e:
         logger.error(str(e))
         print(f"Error: {str(e)}")
-        print("Usage: python merge_json_to_csv.py <json_folder> <output_csv>")
+        print("Usage: python json2csv.py <json_folder> <output_csv> [--external [--keep-key-order]]")
         sys.exit(1)
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}")
         print(f"An unexpected error occurred. Check the logs for details.")
         sys.exit(1)
 
+def main() -> None:
+    """Main entry point for the translation processor."""
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    add_arguments(parser)
+    run(parser.parse_args())
+
 if __name__ == "__main__":
     main()
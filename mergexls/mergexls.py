@@ -1,113 +1,333 @@
 import os
-import pandas as pd
+import io
+import sys
+import argparse
 import zipfile
 import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
 from pathlib import Path
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.metrics import METRICS, add_metrics_arguments, record_run
+
+# pandas and openpyxl are imported where they are used, so runs with nothing
+# to merge do not pay for loading them.
+
+DESCRIPTION = "Merge the Excel files of a ZIP file on their first two columns."
+
+# What to do with a key pair that occurs more than once in one file
+DUPLICATE_POLICIES = ("first", "last", "error")
+
+# Columns parsed when reading sheets from memory (A-C)
+KEY_COLUMNS = 3
+# Cell texts that pd.read_excel reads as missing values
+NA_VALUES = {"", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+             "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"}
+
+# Rows per worksheet allowed by Excel, header included
+MAX_SHEET_ROWS = 1_048_576
+# Rows converted and written at a time by the XLSX and CSV sinks
+WRITE_CHUNK_ROWS = 100_000
+
 def extract_zip(zip_path, extract_path):
     """
     Extract zip file to specified path.
     Returns True if successful, False otherwise.
     """
     try:
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        with METRICS.stage("extract"), zipfile.ZipFile(zip_path, 'r') as zip_ref:
             zip_ref.extractall(extract_path)
         return True
     except Exception as e:
         print(f"Error extracting zip file: {e}")
         return False
 
-def merge_excel_files(folder_path):
+def select_columns(df, filename):
     """
-    Merge multiple Excel files, maintaining consistent first two columns 
-    and adding unique column values from each file.
+    Return the first two columns of df plus its third column renamed after
+    the file, or None (with a message) if df has fewer than three columns.
     """
-    # List to store DataFrames from each Excel file
-    dfs = []
+    # Check if file has at least 3 columns
+    if len(df.columns) < 3:
+        print(f"Skipping {filename}: Not enough columns")
+        return None
     
-    # Iterate through Excel files in the folder
-    for filename in os.listdir(folder_path):
-        if filename.endswith('.xls') or filename.endswith('.xlsx'):
-            # Full path to the file
-            file_path = os.path.join(folder_path, filename)
-            
-            # Read the Excel file
-            try:
-                # Read the entire file
-                df = pd.read_excel(file_path)
-                
-                # Check if file has at least 3 columns
-                if len(df.columns) < 3:
-                    print(f"Skipping {filename}: Not enough columns")
-                    continue
-                
-                # Create a DataFrame with first two columns unchanged
-                processed_df = df.iloc[:, :2].copy()
-                
-                # Add the third column with filename prefix
-                base_filename = os.path.splitext(filename)[0]
-                processed_df[base_filename] = df.iloc[:, 2]
-                
-                dfs.append(processed_df)
-                
-            except Exception as e:
-                print(f"Error processing file {filename}: {e}")
+    # Create a DataFrame with first two columns unchanged
+    processed_df = df.iloc[:, :2].copy()
     
-    # Merge all DataFrames 
-    if dfs:
-        # Start with the first DataFrame
-        merged_df = dfs[0]
-        
-        # Merge subsequent DataFrames
-        for df in dfs[1:]:
-            # Merge on first two columns
-            merged_df = pd.merge(merged_df, df, on=df.columns[:2].tolist(), how='outer')
+    # Add the third column with filename prefix
+    base_filename = os.path.splitext(filename)[0]
+    processed_df[base_filename] = df.iloc[:, 2]
+    
+    return processed_df
+
+def read_excel_file(file_path):
+    """
+    Read an Excel file and return its first two columns plus its third column
+    renamed after the file, or None (with a message) if it cannot be used.
+    """
+    import pandas as pd
+
+    filename = os.path.basename(file_path)
+    try:
+        # Read the entire file
+        with METRICS.stage("read"):
+            df = pd.read_excel(file_path)
+        METRICS.record_file(filename, rows=len(df), input_bytes=os.path.getsize(file_path))
+        return select_columns(df, filename)
         
-        return merged_df
+    except Exception as e:
+        print(f"Error processing file {filename}: {e}")
+        return None
+
+def convert_cell(cell):
+    """Return the value of an openpyxl cell converted like pd.read_excel does."""
+    if cell.value is None:
+        return ""
+    if cell.data_type == "e":
+        return float("nan")
+    if cell.data_type == "n":
+        value = int(cell.value)
+        return value if value == cell.value else float(cell.value)
+    return cell.value
+
+def frame_from_rows(rows):
+    """
+    Build a DataFrame from sheet rows with the first row as header, like
+    pd.read_excel: empty header cells become "Unnamed: <n>", repeated names
+    get ".1", ".2", ... and the other labels keep the values of their cells
+    (a header of -7, 2.5 and 3 is not turned into floats). Empty cells and
+    NA_VALUES become NaN, and columns take the type of their values, text
+    that is all numbers included.
+    """
+    import pandas as pd
+
+    if not rows:
+        return pd.DataFrame()
+    width = max(len(row) for row in rows)
+    rows = [row + [""] * (width - len(row)) for row in rows]
+
+    columns = []
+    for index, name in enumerate(rows[0]):
+        name = f"Unnamed: {index}" if name == "" else name
+        base, number = name, 0
+        while name in columns:
+            number += 1
+            name = f"{base}.{number}"
+        columns.append(name)
+
+    body = [[float("nan") if isinstance(value, str) and value in NA_VALUES else value for value in row]
+            for row in rows[1:]]
+    df = pd.DataFrame(body, columns=range(width), dtype=object)
+    for index in range(width if body else 0):
+        try:
+            df[index] = pd.to_numeric(df[index])
+        except (ValueError, TypeError):
+            df[index] = df[index].infer_objects()
+    df.columns = pd.Index(columns, dtype=object)
+    return df
+
+def read_first_columns(data, filename):
+    """
+    Read only columns A-C of the first sheet of an Excel file held in memory.
+    .xlsx files are streamed row by row with openpyxl's read-only reader,
+    which stops every row at column C; cells, trailing empty rows and the
+    header are handled like pd.read_excel does. Other formats go through
+    pd.read_excel limited to the same columns.
+    """
+    import pandas as pd
+
+    if not filename.endswith('.xlsx'):
+        return pd.read_excel(io.BytesIO(data), usecols="A:C")
+
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        if not workbook.worksheets:
+            return pd.DataFrame()
+        sheet = workbook.worksheets[0]
+        # Do not trust the <dimension> element of the sheet, like pd.read_excel
+        sheet.reset_dimensions()
+        rows = []
+        last_row_with_data = -1
+        for row in sheet.iter_rows(max_col=KEY_COLUMNS):
+            values = [convert_cell(cell) for cell in row]
+            while values and values[-1] == "":
+                values.pop()
+            if values:
+                last_row_with_data = len(rows)
+            rows.append(values)
+    finally:
+        workbook.close()
+    return frame_from_rows(rows[:last_row_with_data + 1])
+
+def read_zip_member(zip_ref, name):
+    """
+    Read an Excel file straight from an open ZIP file, without extracting it.
+    Returns the same DataFrame as read_excel_file, or None (with a message).
+    """
+    try:
+        with METRICS.stage("extract"):
+            data = zip_ref.read(name)
+        with METRICS.stage("read"):
+            df = read_first_columns(data, name)
+        METRICS.record_file(name, rows=len(df), input_bytes=len(data))
+        return select_columns(df, name)
+    except Exception as e:
+        print(f"Error processing file {name}: {e}")
+        return None
+
+def read_zip_path_member(zip_path, name):
+    """Open a ZIP file and read one of its Excel files with read_zip_member."""
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        return read_zip_member(zip_ref, name)
+
+def _read_captured(read, args):
+    """Run read(*args) in a worker process and return its result, printed output and METRICS snapshot."""
+    METRICS.reset()
+    output = io.StringIO()
+    with redirect_stdout(output):
+        result = read(*args)
+    return result, output.getvalue(), METRICS.snapshot()
+
+def load_frames(read, jobs, workers=1):
+    """
+    Run read(*args) for every args in jobs and return the DataFrames that
+    were read, skipping None, in job order.
+    With more than one worker (0 = one per CPU core) the files are parsed in
+    a process pool; the messages of each file are printed in job order too,
+    and their metrics are merged into METRICS.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) < 2:
+        results = (read(*args) for args in jobs)
+        return [df for df in results if df is not None]
+    
+    dfs = []
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+        for df, output, metrics in executor.map(_read_captured, [read] * len(jobs), jobs):
+            print(output, end="")
+            METRICS.merge(metrics)
+            if df is not None:
+                dfs.append(df)
+    return dfs
+
+def merge_zip_file(zip_path, duplicates="first", workers=1):
+    """
+    Merge the Excel files at the top level of a ZIP file like merge_excel_files,
+    reading each one from memory and parsing only its first three columns.
+    """
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        names = sorted(name for name in zip_ref.namelist()
+                       if '/' not in name and (name.endswith('.xls') or name.endswith('.xlsx')))
+    dfs = load_frames(read_zip_path_member, [(zip_path, name) for name in names], workers)
+    
+    if dfs:
+        with METRICS.stage("merge"):
+            return join_frames(dfs, duplicates)
     else:
-        print("No Excel files found in the specified folder.")
+        print("No Excel files found in the zip file.")
         return None
 
-def main():
-    # Get the script's directory
-    script_dir = os.path.dirname(os.path.abspath(__file__))
+def join_frames(dfs, duplicates="first"):
+    """
+    Outer-join DataFrames on their first two columns in one step.
+    The key pairs of all frames are factorized together into row numbers of
+    the result, and every third column is placed at its rows by one reindex,
+    instead of merging the frames one at a time. Rows are sorted by key, and
+    the key columns take the names of the first frame.
+    duplicates decides what happens to a key pair that occurs more than once
+    in one frame: "first" or "last" keeps that row, "error" raises ValueError.
+    """
+    import pandas as pd
+
+    if duplicates not in DUPLICATE_POLICIES:
+        raise ValueError(f"Unknown duplicate key policy: {duplicates}")
     
-    # Look for zip files in the script's directory
-    zip_files = [f for f in os.listdir(script_dir) if f.endswith('.zip')]
+    key_names = dfs[0].columns[:2].tolist()
+    first_keys = pd.concat([df.iloc[:, 0] for df in dfs], ignore_index=True)
+    second_keys = pd.concat([df.iloc[:, 1] for df in dfs], ignore_index=True)
     
-    if not zip_files:
-        print("No zip files found in the script's directory.")
-        return
+    # Number every distinct key pair; NaN keys match each other like in pd.merge
+    first_codes, first_uniques = pd.factorize(first_keys, use_na_sentinel=False)
+    second_codes, second_uniques = pd.factorize(second_keys, use_na_sentinel=False)
+    pair_codes, pairs = pd.factorize(first_codes.astype("int64") * len(second_uniques) + second_codes)
+    keys = pd.DataFrame({
+        key_names[0]: first_uniques.take(pairs // len(second_uniques)),
+        key_names[1]: second_uniques.take(pairs % len(second_uniques)),
+    })
+    
+    try:
+        order = keys.sort_values(key_names, kind="stable").index.to_numpy()
+    except TypeError:
+        # Keys of mixed types cannot be sorted; keep the order they appear in
+        order = keys.index.to_numpy()
+    # Row of every key pair in the sorted result
+    rows = pd.Series(range(len(order)), index=order).sort_index().to_numpy()
     
-    if len(zip_files) > 1:
-        print("Multiple zip files found. Using the first one:", zip_files[0])
+    columns = {key_names[0]: keys[key_names[0]].take(order).to_numpy(),
+               key_names[1]: keys[key_names[1]].take(order).to_numpy()}
+    start = 0
+    for df in dfs:
+        df_rows = pd.Series(rows[pair_codes[start:start + len(df)]])
+        start += len(df)
+        values = df.iloc[:, 2].reset_index(drop=True)
+        
+        if duplicates == "error":
+            duplicated = df_rows.duplicated(keep=False)
+            if duplicated.any():
+                pairs_shown = df.iloc[duplicated.to_numpy(), :2].drop_duplicates().head(10)
+                raise ValueError(f"Duplicate keys in {df.columns[2]}: {list(pairs_shown.itertuples(index=False, name=None))}")
+        else:
+            duplicated = df_rows.duplicated(keep=duplicates)
+            if duplicated.any():
+                df_rows = df_rows[~duplicated]
+                values = values[~duplicated]
+        
+        values.index = df_rows.to_numpy()
+        columns[df.columns[2]] = values.reindex(range(len(order))).to_numpy()
     
-    zip_path = os.path.join(script_dir, zip_files[0])
+    return pd.DataFrame(columns)
+
+def merge_excel_files(folder_path, duplicates="first", workers=1):
+    """
+    Merge multiple Excel files, maintaining consistent first two columns 
+    and adding unique column values from each file.
+    Files are read in filename order, which is also the order of the added
+    columns. See join_frames for the duplicates policy and load_frames for workers.
+    """
+    # Excel files in the folder, sorted so the column order does not depend on the file system
+    file_paths = [(os.path.join(folder_path, filename),) for filename in sorted(os.listdir(folder_path))
+                  if filename.endswith('.xls') or filename.endswith('.xlsx')]
+    dfs = load_frames(read_excel_file, file_paths, workers)
     
+    # Merge all DataFrames 
+    if dfs:
+        with METRICS.stage("merge"):
+            return join_frames(dfs, duplicates)
+    else:
+        print("No Excel files found in the specified folder.")
+        return None
+
+def merge_extracted(zip_path, script_dir, duplicates="first", workers=1):
+    """Extract a ZIP file into a temporary folder, merge its Excel files and remove the folder."""
     # Create a temporary directory for extracted files
     temp_dir = os.path.join(script_dir, 'temp_excel_files')
     os.makedirs(temp_dir, exist_ok=True)
     
     try:
         # Extract zip file
-        print(f"Extracting {zip_files[0]}...")
+        print(f"Extracting {os.path.basename(zip_path)}...")
         if not extract_zip(zip_path, temp_dir):
             print("Failed to extract zip file. Exiting.")
-            return
+            return None
         
         # Merge Excel files
         print("Merging Excel files...")
-        merged_result = merge_excel_files(temp_dir)
-        
-        # Save the merged result
-        if merged_result is not None:
-            output_path = os.path.join(script_dir, 'merged_output.xlsx')
-            merged_result.to_excel(output_path, index=False)
-            print(f"Merged file saved to {output_path}")
-            
-            # Print column names for verification
-            print("\nColumns in merged file:")
-            print(merged_result.columns.tolist())
+        return merge_excel_files(temp_dir, duplicates, workers)
     
     finally:
         # Clean up: remove temporary directory and its contents
@@ -117,5 +337,146 @@ def main():
         except Exception as e:
             print(f"Error cleaning up temporary files: {e}")
 
+def iter_chunks(df, chunk_rows=WRITE_CHUNK_ROWS):
+    """Yield df in slices of at most chunk_rows rows, with missing values as None."""
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows].astype(object)
+        yield chunk.where(chunk.notna(), None)
+
+def write_xlsx(df, output_path, max_rows=MAX_SHEET_ROWS):
+    """
+    Write df to an XLSX file with a write-only workbook, streaming rows instead
+    of building every cell in memory. When df has more rows than fit on one
+    sheet the rest spill into Sheet2, Sheet3, ..., each starting with the header.
+    """
+    from openpyxl import Workbook
+
+    header = [str(column) for column in df.columns]
+    rows_per_sheet = max_rows - 1
+    wb = Workbook(write_only=True)
+    ws = None
+    written = 0
+    for chunk in iter_chunks(df):
+        for row in chunk.itertuples(index=False, name=None):
+            if written % rows_per_sheet == 0:
+                ws = wb.create_sheet(f"Sheet{written // rows_per_sheet + 1}")
+                ws.append(header)
+            ws.append(row)
+            written += 1
+    if ws is None:
+        wb.create_sheet("Sheet1").append(header)
+    wb.save(output_path)
+
+def write_csv(df, output_path):
+    """Write df to a UTF-8 CSV file, WRITE_CHUNK_ROWS rows at a time."""
+    df.to_csv(output_path, index=False, encoding='utf-8', chunksize=WRITE_CHUNK_ROWS)
+
+def write_parquet(df, output_path):
+    """Write df to a Parquet file. Needs pyarrow or fastparquet."""
+    try:
+        df.to_parquet(output_path, index=False)
+    except ImportError as e:
+        raise ValueError(f"Parquet output needs pyarrow or fastparquet: {e}") from e
+
+# Output sinks: format -> (writer, file extension)
+OUTPUT_SINKS = {
+    "xlsx": (write_xlsx, ".xlsx"),
+    "csv": (write_csv, ".csv"),
+    "parquet": (write_parquet, ".parquet"),
+}
+
+def save_merged(df, output_base, output_format):
+    """
+    Write df with the sink for output_format to output_base plus its extension
+    and report the bytes written and the elapsed time. Returns the output path.
+    """
+    write, extension = OUTPUT_SINKS[output_format]
+    output_path = output_base + extension
+    start = time.perf_counter()
+    with METRICS.stage("save"):
+        write(df, output_path)
+    elapsed = time.perf_counter() - start
+    size = os.path.getsize(output_path)
+    METRICS.count("merged_rows", len(df))
+    METRICS.count("output_bytes", size)
+    print(f"Merged file saved to {output_path} ({len(df):,} rows, {size:,} bytes in {elapsed:.2f}s)")
+    return output_path
+
+def add_arguments(parser):
+    """Add the options of this tool to an argument parser."""
+    parser.add_argument("--zip", metavar="PATH",
+                        help="ZIP file to merge (default: the first ZIP file in the folder of this script)")
+    parser.add_argument("--output", metavar="BASE",
+                        help="output path without extension (default: merged_output in the folder of this script)")
+    parser.add_argument("--duplicates", choices=DUPLICATE_POLICIES, default="first",
+                        help="keep the first or last row of a key pair that occurs more than once in a file, or stop with an error")
+    parser.add_argument("--extract", action="store_true",
+                        help="extract the ZIP file to a temporary folder and read whole sheets, instead of reading columns A-C from memory")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="read Excel files in N processes in parallel (0 = one per CPU core)")
+    parser.add_argument("--output-format", choices=OUTPUT_SINKS, default="xlsx",
+                        help="write the merged result as XLSX (spilling into extra sheets past Excel's row limit), CSV or Parquet")
+    add_metrics_arguments(parser, "mergexls")
+
+def merge_and_save(zip_path, output_base, args):
+    """Merge the Excel files of one ZIP file and save the result; errors are printed."""
+    try:
+        if args.extract:
+            merged_result = merge_extracted(zip_path, os.path.dirname(zip_path), args.duplicates, args.workers)
+        else:
+            print(f"Merging Excel files in {os.path.basename(zip_path)}...")
+            merged_result = merge_zip_file(zip_path, args.duplicates, args.workers)
+    except ValueError as e:
+        print(f"Error merging Excel files: {e}")
+        return
+    
+    # Save the merged result
+    if merged_result is not None:
+        try:
+            save_merged(merged_result, output_base, args.output_format)
+        except ValueError as e:
+            print(f"Error saving merged file: {e}")
+            return
+    
+        # Print column names for verification
+        print("\nColumns in merged file:")
+        print(merged_result.columns.tolist())
+
+def run(args, paths=None):
+    """
+    Run the tool with parsed options. With paths (e.g. the ZIP files a watcher
+    saw change), each of these ZIP files is merged into <name>_merged next to it.
+    """
+    with record_run("mergexls", args.metrics, args.profile):
+        if paths is not None:
+            for zip_path in paths:
+                merge_and_save(os.path.abspath(zip_path), os.path.splitext(zip_path)[0] + "_merged", args)
+            return
+        
+        # Get the script's directory
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        
+        if args.zip:
+            zip_path = os.path.abspath(args.zip)
+        else:
+            # Look for zip files in the script's directory
+            zip_files = sorted(f for f in os.listdir(script_dir) if f.endswith('.zip'))
+            
+            if not zip_files:
+                print("No zip files found in the script's directory.")
+                return
+            
+            if len(zip_files) > 1:
+                print("Multiple zip files found. Using the first one:", zip_files[0])
+            
+            zip_path = os.path.join(script_dir, zip_files[0])
+        
+        merge_and_save(zip_path, args.output or os.path.join(script_dir, 'merged_output'), args)
+
+def main():
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    add_arguments(parser)
+    run(parser.parse_args())
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
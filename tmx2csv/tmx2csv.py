@@ -0,0 +1,154 @@
+import os
+import csv
+import argparse
+import xml.etree.ElementTree as ET
+
+XML_LANG = "{http://www.w3.org/XML/1998/namespace}lang"
+
+# Header used for the x-segment-id column of TMX files
+KEY_ID = "key"
+
+DESCRIPTION = "Convert the TMX and TBX files in the current directory tree back to CSV."
+
+def iter_entries(xml_path, tag):
+    """
+    Incrementally parse an XML file and yield each <tag> element once it is complete.
+    Every yielded element, and every element outside of one, is cleared and
+    detached from its parent afterwards, so memory is bounded by one entry
+    regardless of file size.
+    """
+    open_elements = []
+    open_entries = 0
+    for event, elem in ET.iterparse(xml_path, events=("start", "end")):
+        if event == "start":
+            open_elements.append(elem)
+            if elem.tag == tag:
+                open_entries += 1
+            continue
+        open_elements.pop()
+        if elem.tag == tag:
+            open_entries -= 1
+            yield elem
+        elif open_entries:
+            # Part of an entry that is still being parsed
+            continue
+        elem.clear()
+        if open_elements:
+            open_elements[-1].remove(elem)
+
+def scan_languages(xml_path, tag):
+    """Return the xml:lang values of all <tag> elements, in order of first appearance."""
+    languages = {}
+    for elem in iter_entries(xml_path, tag):
+        languages.setdefault(elem.get(XML_LANG), None)
+    return [lang for lang in languages if lang]
+
+def get_text(elem):
+    """Return all text inside an element, including text of inline children."""
+    return "".join(elem.itertext()) if elem is not None else ""
+
+def convert_tmx_to_csv(tmx_path, csv_path, key_id="key", languages=None):
+    """
+    Converts a TMX file written by csv2tmx (or any TMX 1.4 file) back to CSV.
+    Columns are key_id followed by one column per language. The x-segment-id prop
+    fills the key column; the previous/next source context props are dropped.
+    When languages is None the file is scanned once to discover them.
+    """
+    print(f"Processing: {tmx_path}")
+
+    if languages is None:
+        languages = scan_languages(tmx_path, "tuv")
+
+    with open(csv_path, "w", newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow([key_id] + languages)
+
+        for tu in iter_entries(tmx_path, "tu"):
+            key = ""
+            for prop in tu.iterfind("prop"):
+                if prop.get("type") == "x-segment-id":
+                    key = prop.text or ""
+                    break
+            segments = {tuv.get(XML_LANG): get_text(tuv.find("seg")) for tuv in tu.iterfind("tuv")}
+            writer.writerow([key] + [segments.get(lang, "") for lang in languages])
+
+    print(f"Finished writing: {csv_path}\n")
+
+def convert_tbx_to_csv(tbx_path, csv_path, languages=None):
+    """
+    Converts a TBX file written by csv2tbx back to CSV.
+    Columns are POS and Definition followed by one column per language, matching
+    the csv2tbx input. The first non-empty partOfSpeech of an entry fills POS.
+    When languages is None the file is scanned once to discover them.
+    """
+    print(f"Processing: {tbx_path}")
+
+    if languages is None:
+        languages = scan_languages(tbx_path, "langSet")
+
+    with open(csv_path, "w", newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["POS", "Definition"] + languages)
+
+        for term_entry in iter_entries(tbx_path, "termEntry"):
+            definition = ""
+            for descrip in term_entry.iterfind("descrip"):
+                if descrip.get("type") == "definition":
+                    definition = descrip.text or ""
+                    break
+
+            pos = ""
+            terms = {}
+            for lang_set in term_entry.iterfind("langSet"):
+                tig = lang_set.find("tig")
+                if tig is None:
+                    continue
+                terms[lang_set.get(XML_LANG)] = get_text(tig.find("term"))
+                if not pos:
+                    for term_note in tig.iterfind("termNote"):
+                        if term_note.get("type") == "partOfSpeech":
+                            pos = term_note.text or ""
+                            break
+
+            writer.writerow([pos, definition] + [terms.get(lang, "") for lang in languages])
+
+    print(f"Finished writing: {csv_path}\n")
+
+def convert_files(key_id=KEY_ID, languages=None):
+    """
+    Convert every TMX and TBX file in the current directory and its
+    subdirectories to <name>_tmx.csv or <name>_tbx.csv next to it.
+    """
+    for root, _, files in os.walk("."):
+        for file in files:
+            name, ext = os.path.splitext(file)
+            if ext not in (".tmx", ".tbx"):
+                continue
+
+            xml_path = os.path.join(root, file)
+            csv_path = os.path.join(root, f"{name}_{ext[1:]}.csv")
+            try:
+                if ext == ".tmx":
+                    convert_tmx_to_csv(xml_path, csv_path, key_id, languages)
+                else:
+                    convert_tbx_to_csv(xml_path, csv_path, languages)
+            except Exception as e:
+                print(f"Error processing {xml_path}: {e}")
+
+def add_arguments(parser):
+    """Add the options of this tool to an argument parser."""
+    parser.add_argument("--key-id", default=KEY_ID, help="header of the key column of TMX files (default: %(default)s)")
+    parser.add_argument("--languages", nargs="+", metavar="LANG",
+                        help="language columns to write, in this order (default: every language found in the file)")
+
+def run(args):
+    """Run the tool with parsed options."""
+    convert_files(args.key_id, args.languages)
+
+def main():
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    add_arguments(parser)
+    run(parser.parse_args())
+
+if __name__ == "__main__":
+    main()